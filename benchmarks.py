@@ -0,0 +1,155 @@
+# Benchmarks for the circularsocieties module
+#
+# Every operation (and the generators themselves) is run on societies generated by generateRandomSociety,
+#   generateRandomFixedLengthSociety and generateUniformCircularSociety, for society sizes from 10 to 10^5 sets.  For each (operation, society, size),
+#   the time (best of a few runs, with a freshly generated society for every run, so that no cached result is
+#   reused) and the peak memory (with tracemalloc, in a separate run) are recorded.
+#
+# Usage:
+#   python benchmarks.py                               run all benchmarks and print the results
+#   python benchmarks.py --save baseline.json          ... and save them as a baseline
+#   python benchmarks.py --baseline baseline.json      ... and compare them with a baseline, flagging regressions
+#                                                      (the exit status is 1 if there is a regression)
+#   python benchmarks.py --sizes 10 100 --operations findAgreementNumber uniformize --societies random
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+import circularsocieties as cs
+
+
+# Societies: name -> function generating a society with N sets (the random seed is fixed by the caller)
+SOCIETIES = {
+    'random': lambda N: cs.generateRandomSociety( 'random', N, 10 ),
+    'fixedLength': lambda N: cs.generateRandomFixedLengthSociety( 'fixedLength', N, 10, 0.3 ),
+    'uniform': lambda N: cs.generateUniformCircularSociety( 'uniform', N, max( 1, N // 3 ) ),
+}
+
+# Operations: name -> (function applied to a society, largest size it is run at)
+#   'generate' benchmarks the generator of each kind of society (it has no function: the generator is timed)
+OPERATIONS = {
+    'generate': ( None, 10**5 ),
+    'listSetEndpoints': ( lambda CS: CS.listSetEndpoints(), 10**5 ),
+    'findAgreementNumber': ( lambda CS: CS.findAgreementNumber(), 10**5 ),
+    'findPiercingNumber': ( lambda CS: CS.findPiercingNumber(), 10**5 ),
+    'piercingAlgorithm': ( lambda CS: CS.piercingAlgorithm(), 10**5 ),
+    'checkAgreeability': ( lambda CS: CS.checkAgreeability( 3, CS.numVoters // 2 + 1 ), 10**3 ), # dense LP matrix
+    'checkContainmentAll': ( lambda CS: CS.checkContainmentAll(), 10**5 ),
+    'is_LR_alt': ( lambda CS: CS.is_LR_alt(), 10**5 ),
+    'eliminateRRLAll': ( lambda CS: CS.eliminateRRLAll(), 10**5 ),
+    'uniformize': ( lambda CS: CS.uniformize(), 10**5 ),
+}
+
+DEFAULT_SIZES = [ 10, 100, 1000, 10000, 100000 ]
+
+
+# Function to benchmark one operation on one kind of society
+# returns the best time (seconds) over the runs, and the peak memory (bytes) allocated during one run
+def benchmark( operation, society, N, repeat ):
+    run, _ = OPERATIONS[operation]
+    generate = SOCIETIES[society]
+
+    if run is None:
+        run = lambda CS: generate( N )
+
+    times = []
+    for i in range( repeat ):
+        np.random.seed( i )
+        CS = generate( N ) if operation != 'generate' else None
+        start = time.perf_counter()
+        run( CS )
+        times.append( time.perf_counter() - start )
+
+    np.random.seed( 0 )
+    CS = generate( N ) if operation != 'generate' else None
+    tracemalloc.start()
+    try:
+        run( CS )
+        _, peakMemory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return min( times ), peakMemory
+
+# Function to run all the benchmarks
+# returns the list of results {'operation', 'society', 'size', 'time', 'peakMemory'}
+def runBenchmarks( sizes, operations, societies, repeat, verbose = True ):
+    results = []
+    for operation in operations:
+        _, maxSize = OPERATIONS[operation]
+        for society in societies:
+            for N in sizes:
+                if N > maxSize:
+                    continue
+                elapsed, peakMemory = benchmark( operation, society, N, repeat )
+                results.append( { 'operation': operation, 'society': society, 'size': N,
+                                  'time': elapsed, 'peakMemory': peakMemory } )
+                if verbose:
+                    print( formatResult( results[-1] ) )
+                    sys.stdout.flush()
+    return results
+
+# Function to compare results with a baseline
+#   A result is a regression when it is more than tolerance times slower (or larger) than in the baseline, and
+#   the difference is larger than minTime seconds (or minMemory bytes), so that noise on tiny timings is ignored.
+# returns the list of regressions [result, baseline result, description]
+def findRegressions( results, baseline, tolerance = 1.5, minTime = 1e-3, minMemory = 2**16 ):
+    baselineResults = { ( r['operation'], r['society'], r['size'] ): r for r in baseline['results'] }
+    regressions = []
+    for r in results:
+        b = baselineResults.get( ( r['operation'], r['society'], r['size'] ) )
+        if b is None:
+            continue
+        if r['time'] > tolerance * b['time'] and r['time'] - b['time'] > minTime:
+            regressions.append( [ r, b, "time %.3gs -> %.3gs" % ( b['time'], r['time'] ) ] )
+        if r['peakMemory'] > tolerance * b['peakMemory'] and r['peakMemory'] - b['peakMemory'] > minMemory:
+            regressions.append( [ r, b, "peak memory %s -> %s" % ( formatBytes( b['peakMemory'] ), formatBytes( r['peakMemory'] ) ) ] )
+    return regressions
+
+def formatBytes( numBytes ):
+    for unit in [ 'B', 'KB', 'MB' ]:
+        if numBytes < 1024:
+            return "%.1f%s" % ( numBytes, unit )
+        numBytes /= 1024
+    return "%.1fGB" % numBytes
+
+def formatResult( r ):
+    return "%-22s %-12s %7d   %10.6fs   %10s" % ( r['operation'], r['society'], r['size'], r['time'], formatBytes( r['peakMemory'] ) )
+
+
+def main():
+    parser = argparse.ArgumentParser( description = "Benchmarks for the circularsocieties module" )
+    parser.add_argument( '--sizes', type = int, nargs = '+', default = DEFAULT_SIZES, help = "society sizes (numbers of sets)" )
+    parser.add_argument( '--operations', nargs = '+', default = list( OPERATIONS ), choices = list( OPERATIONS ) )
+    parser.add_argument( '--societies', nargs = '+', default = list( SOCIETIES ), choices = list( SOCIETIES ) )
+    parser.add_argument( '--repeat', type = int, default = 3, help = "number of timed runs (the best one is kept)" )
+    parser.add_argument( '--save', help = "save the results to this JSON file (as a baseline)" )
+    parser.add_argument( '--baseline', help = "compare the results with this JSON baseline" )
+    parser.add_argument( '--tolerance', type = float, default = 1.5, help = "slowdown factor flagged as a regression" )
+    args = parser.parse_args()
+
+    results = runBenchmarks( args.sizes, args.operations, args.societies, args.repeat )
+
+    if args.save is not None:
+        with open( args.save, 'w' ) as f:
+            json.dump( { 'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine(),
+                         'results': results }, f, indent = 1 )
+
+    if args.baseline is not None:
+        with open( args.baseline ) as f:
+            baseline = json.load( f )
+        regressions = findRegressions( results, baseline, tolerance = args.tolerance )
+        if len( regressions ) == 0:
+            print( "No regressions against " + args.baseline )
+        else:
+            print( str( len(regressions) ) + " regression(s) against " + args.baseline + ":" )
+            for r, _, description in regressions:
+                print( "  %s / %s / %d: %s" % ( r['operation'], r['society'], r['size'], description ) )
+            sys.exit( 1 )
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,157 @@
 import numpy as np
-import scipy as sp
-import cvxpy as cp
-import matplotlib.pyplot as plt
 import itertools
+import importlib
+import statistics
+import bisect
+import os
+import json
+import struct
+import hashlib
+import pickle
+import collections
+import concurrent.futures
+import contextlib
+import functools
+import time
+import random
+
+# The solver and plotting packages (scipy, cvxpy, matplotlib) are only needed by a few methods, and are imported
+#   when these methods are first used, so that the core of the module only needs numpy
+def _importOptional( moduleName, purpose ):
+    try:
+        return importlib.import_module( moduleName )
+    except ImportError as error:
+        package = moduleName.split( '.' )[0]
+        raise ImportError( "The optional package '" + package + "' is required for " + purpose
+                           + " (install it with: pip install " + package + ")" ) from error
+
+# Instrumentation ----------------------------------
+# When instrumentation is enabled (enableInstrumentation), the main methods record their number of calls and their
+#   cumulative time, some of them the time of their phases (e.g. building the constraint matrix vs. solving the
+#   ILP), the status of the solvers, and counters such as the number of swaps made by eliminateRRLAll.  When it is
+#   disabled (the default), an instrumented method only costs one extra function call.
+_stats = None
+
+class InstrumentationStats:
+    def __init__( self ):
+        self.calls = {}         # name -> number of calls
+        self.times = {}         # name -> cumulative wall time (seconds), including nested calls
+        self.phaseTimes = {}    # phase name -> cumulative wall time (seconds)
+        self.solverStatus = {}  # solver -> { status -> number of solves }
+        self.counters = {}      # name -> cumulative count (e.g. iterations)
+    
+    # Method to add a number to a counter (e.g. an iteration count)
+    def count( self, name, value = 1 ):
+        self.counters[name] = self.counters.get( name, 0 ) + value
+    
+    # Method to record the status returned by a solver
+    def recordSolverStatus( self, solver, status ):
+        statuses = self.solverStatus.setdefault( solver, {} )
+        statuses[str(status)] = statuses.get( str(status), 0 ) + 1
+    
+    # Method to add the statistics of another InstrumentationStats (or of its dictionary), e.g. from a worker process
+    def merge( self, other ):
+        if isinstance( other, InstrumentationStats ):
+            other = other.asDict()
+        for field in [ 'calls', 'times', 'phaseTimes', 'counters' ]:
+            mine = getattr( self, field )
+            for name, value in other[field].items():
+                mine[name] = mine.get( name, 0 ) + value
+        for solver, statuses in other['solverStatus'].items():
+            for status, value in statuses.items():
+                mine = self.solverStatus.setdefault( solver, {} )
+                mine[status] = mine.get( status, 0 ) + value
+        return self
+    
+    def asDict( self ):
+        return { 'calls': dict( self.calls ), 'times': dict( self.times ), 'phaseTimes': dict( self.phaseTimes ),
+                 'solverStatus': { solver: dict( statuses ) for solver, statuses in self.solverStatus.items() },
+                 'counters': dict( self.counters ) }
+    
+    # Method to save the statistics to a JSON file (load them with InstrumentationStats.load)
+    def dump( self, filename ):
+        with open( filename, 'w' ) as f:
+            json.dump( self.asDict(), f, indent = 1 )
+    
+    @staticmethod
+    def load( filename ):
+        with open( filename ) as f:
+            return InstrumentationStats().merge( json.load( f ) )
+    
+    # Method to print the statistics, most time-consuming methods first
+    def printStats( self ):
+        print( "Method calls (count, cumulative time):" )
+        for name in sorted( self.times, key = self.times.get, reverse = True ):
+            print( "  %-50s %9d %12.6fs" % ( name, self.calls[name], self.times[name] ) )
+        if len( self.phaseTimes ) > 0:
+            print( "Phases (cumulative time):" )
+            for name in sorted( self.phaseTimes, key = self.phaseTimes.get, reverse = True ):
+                print( "  %-50s %22.6fs" % ( name, self.phaseTimes[name] ) )
+        if len( self.solverStatus ) > 0:
+            print( "Solver status:" )
+            for solver, statuses in self.solverStatus.items():
+                print( "  " + solver + ": " + ", ".join( status + " x" + str(value) for status, value in statuses.items() ) )
+        if len( self.counters ) > 0:
+            print( "Counters:" )
+            for name, value in self.counters.items():
+                print( "  %-50s %9d" % ( name, value ) )
+
+# Function to enable instrumentation; returns the (new, empty) statistics object that is filled from now on
+def enableInstrumentation():
+    global _stats
+    _stats = InstrumentationStats()
+    return _stats
+
+# Function to disable instrumentation; returns the statistics recorded so far (None if it was not enabled)
+def disableInstrumentation():
+    global _stats
+    stats, _stats = _stats, None
+    return stats
+
+# Function to obtain the statistics being recorded (None if instrumentation is disabled)
+def getInstrumentationStats():
+    return _stats
+
+# Decorator recording the calls and the cumulative time of a function or method
+def _instrumented( function ):
+    name = function.__qualname__
+    @functools.wraps( function )
+    def wrapper( *args, **kwargs ):
+        if _stats is None:
+            return function( *args, **kwargs )
+        stats = _stats
+        start = time.perf_counter()
+        try:
+            return function( *args, **kwargs )
+        finally:
+            stats.times[name] = stats.times.get( name, 0 ) + ( time.perf_counter() - start )
+            stats.calls[name] = stats.calls.get( name, 0 ) + 1
+    return wrapper
+
+# Context manager recording the time of a phase of a computation: with _phase( 'name' ): ...
+_noPhase = contextlib.nullcontext()
+
+def _phase( name ):
+    if _stats is None:
+        return _noPhase
+    return _timedPhase( _stats, name )
+
+@contextlib.contextmanager
+def _timedPhase( stats, name ):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.phaseTimes[name] = stats.phaseTimes.get( name, 0 ) + ( time.perf_counter() - start )
+
+# Function to record a counter or a solver status, if instrumentation is enabled
+def _count( name, value = 1 ):
+    if _stats is not None:
+        _stats.count( name, value )
+
+def _recordSolverStatus( solver, status ):
+    if _stats is not None:
+        _stats.recordSolverStatus( solver, status )
 
 # Part 0 ----------------------------------
 # Define the Set class (approval set)
@@ -59,13 +208,29 @@ class CircularSociety:
         self.list_setnames = []
         self.list_left_endpts = []
         self.list_right_endpts = []
+        
+        # Hash index from set name to the position of the set in the lists above.  A removal shifts the positions of
+        #   the later sets; instead of rewriting their entries, the removed positions (as stored in the index) are
+        #   kept in the sorted list _removedSlots and subtracted on lookup, until there are many of them.
+        self._setIndex = {}
+        self._removedSlots = []
+        
+        # Version counter, increased by every change to the approval sets; results derived from the sets
+        #   (e.g. the columnar endpoint arrays) are cached together with the version they were computed for
+        self.version = 0
+        self._cache = {}
+        
+        # Cyclic order of all endpoints, as arrays sorted by (endpoint, L after R, set position), and the changes
+        #   made since it was last brought up to date (see getEndpointOrder)
+        self._endpointOrder = None
+        self._pendingOrderChanges = []
     
     # method that returns a set given its name
     def getSet( self, setname ):
-      for A in self.approvalSets:
-        if A.name == setname:
-          return A
-      return None
+      ind = self.findApprovalSetName( setname )
+      if ind == -1:
+        return None
+      return self.approvalSets[ind]
     
     ### DISPLAYING / OBTAINING BASIC INFORMATION ABOUT THE CIRCULAR SOCIETY----
     
@@ -83,46 +248,149 @@ class CircularSociety:
         self.listApprovalSets()
     
     # Method to list the endpoints of the sets, from 0 to N
+    @_instrumented
     def listSetEndpoints( self ):
-        N = self.numVoters
-        orderedendpts = []
-        orderednames = []
-        setindices_ordered_left = np.argsort(self.list_left_endpts)
-        setindices_ordered_right = np.argsort(self.list_right_endpts)
-        left_i = 0
-        right_i = 0
-        
-        for step in range( 0, 2*N ):
-            if left_i < N and right_i < N:
-                if self.list_left_endpts[ setindices_ordered_left[left_i] ] < self.list_right_endpts[ setindices_ordered_right[right_i] ]:
-                    orderedendpts.append( self.list_left_endpts[ setindices_ordered_left[left_i] ] )
-                    orderednames.append( 'L' + self.list_setnames[ setindices_ordered_left[left_i] ] )
-                    left_i += 1
-                else:
-                    orderedendpts.append( self.list_right_endpts[ setindices_ordered_right[right_i] ] )
-                    orderednames.append( 'R' + self.list_setnames[ setindices_ordered_right[right_i] ] )
-                    right_i += 1
-            elif left_i == N and right_i < N:
-                orderedendpts.append( self.list_right_endpts[ setindices_ordered_right[right_i] ] )
-                orderednames.append( 'R' + self.list_setnames[ setindices_ordered_right[right_i] ] )
-                right_i += 1
-            else:
-                orderedendpts.append( self.list_left_endpts[ setindices_ordered_left[left_i] ] )
-                orderednames.append( 'L' + self.list_setnames[ setindices_ordered_left[left_i] ] )
-                left_i += 1
+        setIndices, isRight, _ = self.getEndpointOrder()
+        orderednames = [ ('R' if r else 'L') + self.list_setnames[ind] for ind, r in zip( setIndices.tolist(), isRight.tolist() ) ]
+        orderedendpts = [ self.list_right_endpts[ind] if r else self.list_left_endpts[ind] for ind, r in zip( setIndices.tolist(), isRight.tolist() ) ]
         return orderednames, orderedendpts
+    
+    # Method to obtain the cyclic order of the endpoints (from 0 to modulo) as three arrays:
+    #   setIndices (position of the set of each endpoint), isRight (True for right endpoints) and the endpoints.
+    #   At a tie, right endpoints come before left endpoints, and otherwise sets are in order of position.
+    # The order is kept between calls: a few changes are applied one at a time (binary search, then one
+    #   insertion/deletion in each array); after many changes, or the first time, the order is rebuilt by sorting.
+    #   The changes themselves are only queued (O(1)); applying one costs O(log N) comparisons but O(N) copying,
+    #   since the order is kept as contiguous arrays (which the callers use directly).  See DynamicCircularSociety
+    #   for a society whose agreement number is kept up to date in O(log N) per change.
+    @_instrumented
+    def getEndpointOrder( self ):
+        if self._endpointOrder is None:
+            left, right, _ = self.getEndpointArrays()
+            N = self.numVoters
+            endpts = np.concatenate( (left, right) )
+            isLeft = np.repeat( np.array( [1, 0], dtype = np.int64 ), N )
+            setIndices = np.tile( np.arange( N, dtype = np.int64 ), 2 )
+            order = np.lexsort( (setIndices, isLeft, endpts) )
+            self._endpointOrder = [ endpts[order], isLeft[order], setIndices[order] ]
+        else:
+            for change in self._pendingOrderChanges:
+                self._applyOrderChange( *change )
+        self._pendingOrderChanges = []
+        
+        endpts, isLeft, setIndices = self._endpointOrder
+        return setIndices, isLeft == 0, endpts
+    
+    # Method to insert (or delete) the two endpoints of the set at position ind in the cyclic order of endpoints
+    #   shiftAfter = True: the set was removed from the society, so sets after it move up by one position
+    def _applyOrderChange( self, isInsertion, ind, left_endpt, right_endpt, shiftAfter = False ):
+        endpts, isLeft, setIndices = self._endpointOrder
+        for flag, x in [ (1, left_endpt), (0, right_endpt) ]:
+            # endpoints with the same value are ordered by (flag, set position)
+            lo = np.searchsorted( endpts, x, side = 'left' )
+            hi = np.searchsorted( endpts, x, side = 'right' )
+            pos = lo + np.searchsorted( isLeft[lo:hi] * (2**40) + setIndices[lo:hi], flag * (2**40) + ind )
+            if isInsertion:
+                endpts = np.insert( endpts, pos, x )
+                isLeft = np.insert( isLeft, pos, flag )
+                setIndices = np.insert( setIndices, pos, ind )
+            else:
+                endpts = np.delete( endpts, pos )
+                isLeft = np.delete( isLeft, pos )
+                setIndices = np.delete( setIndices, pos )
+        if shiftAfter:
+            setIndices[ setIndices > ind ] -= 1
+        self._endpointOrder = [ endpts, isLeft, setIndices ]
+    
+    # Method to record a change of the approval sets: increases the version (invalidating cached results) and
+    #   queues the corresponding updates of the cyclic order of endpoints.  Once the queue is long enough for the
+    #   order to be rebuilt anyway, the order is dropped instead, so the queue stays short.
+    def _recordChange( self, *orderChanges ):
+        self.version += 1
+        if self._endpointOrder is not None:
+            self._pendingOrderChanges.extend( orderChanges )
+            if len( self._pendingOrderChanges ) > 32:
+                self._endpointOrder = None
+                self._pendingOrderChanges = []
+    
+    # Method to return a cached result computed by compute(), recomputing it if the society changed since
+    def _cached( self, key, compute ):
+        version, value = self._cache.get( key, (None, None) )
+        if version != self.version:
+            value = compute()
+            self._cache[key] = ( self.version, value )
+        return value
+    
+    # Method to obtain the endpoints as contiguous NumPy arrays (left endpoints, right endpoints, wrap-around mask)
+    #   A set wraps around when right_endpt <= left_endpt (if the two are equal, the set is the whole circle)
+    def getEndpointArrays( self ):
+        def compute():
+            left = np.array( self.list_left_endpts, dtype = float )
+            right = np.array( self.list_right_endpts, dtype = float )
+            return ( left, right, right <= left )
+        return self._cached( 'endpointArrays', compute )
+    
+    # Method to build the (number of points) x (number of sets) boolean containment matrix;
+    #   entry [i, j] is True when the i-th point lies in the j-th approval set
+    def containmentMatrix( self, points ):
+        left, right, _ = self.getEndpointArrays()
+        return pointsInSets( points, left, right )
+    
+    # Method to obtain the canonical form of the cyclic order of endpoints, which identifies societies of the same
+    #   combinatorial type (same cyclic L/R word with the same pairs of endpoints and the same ties, up to rotation)
+    #   Each endpoint is encoded by (distance to the other endpoint of its set, R or L, tied with the next endpoint),
+    #   and the word of codes is rotated to its lexicographically least rotation (Booth's algorithm).
+    # returns the hash of the canonical word, and the rotation: the i-th canonical endpoint is the
+    #   ((i + rotation) mod 2N)-th endpoint of getEndpointOrder
+    def getCanonicalForm( self ):
+        def compute():
+            setIndices, isRight, endpts = self.getEndpointOrder()
+            numEndpts = len( isRight )
+            positions = np.empty( (2, self.numVoters), dtype = np.int64 )
+            positions[ isRight.astype( np.int64 ), setIndices ] = np.arange( numEndpts )
+            partner = positions[ 1 - isRight.astype( np.int64 ), setIndices ]
+            isTied = endpts == np.roll( endpts, -1 )
+            codes = ( ( partner - np.arange( numEndpts ) ) % max( numEndpts, 1 ) ) * 4 + isRight * 2 + isTied
+            rotation = _leastRotation( codes.tolist() )
+            key = hashlib.blake2b( np.roll( codes, -rotation ).astype( '<i8' ).tobytes(), digest_size = 16 ).hexdigest()
+            return key, rotation
+        return self._cached( 'canonicalForm', compute )
+    
+    # Method to check if the results of the society are looked up in the result cache (see Part 7): only for
+    #   societies with at most maxSets sets
+    def _usesResultCache( self ):
+        return _resultCache is not None and 0 < self.numVoters <= _resultCache.maxSets
+    
+    # Method to look up a result in the result cache (see Part 7), computing it with compute() when it is missing
+    #   Results are shared by all societies with the same canonical form, so compute() must express endpoints
+    #   as positions in the canonical order (see _toCanonicalPositions)
+    def _cachedResult( self, kind, compute ):
+        if _resultCache is None:
+            return compute()
+        key, _ = self.getCanonicalForm()
+        return _resultCache.get( (kind, key), compute )
+    
+    # Methods to convert positions in the cyclic order of endpoints to positions in the canonical order, and back
+    def _toCanonicalPositions( self, positions ):
+        _, rotation = self.getCanonicalForm()
+        return tuple( ( ( np.asarray( positions ) - rotation ) % ( 2*self.numVoters ) ).tolist() )
+    
+    def _fromCanonicalPositions( self, positions ):
+        _, rotation = self.getCanonicalForm()
+        return ( np.asarray( positions, dtype = np.int64 ) + rotation ) % ( 2*self.numVoters )
       
     
     ### FINDING, EDITING, ADDING, REMOVING APPROVAL SETS-----------------------
     
     # Method to find an approval set by name
     def findApprovalSetName( self, setName ):
-        for ind, A in enumerate( self.approvalSets ):
-            if setName == A.name:
-                return ind # if set name found, return index
-        return -1 # if set name not found, return -1 
+        slot = self._setIndex.get( setName, -1 ) # if set name not found, return -1 
+        if slot == -1 or len( self._removedSlots ) == 0:
+            return slot
+        return slot - bisect.bisect_left( self._removedSlots, slot )
     
     # Method to add a new approval set into the society
+    @_instrumented
     def addApprovalSet( self, setName, left_endpt, right_endpt ):
         # Check that setName is different from names of sets already on the list
         ind = self.findApprovalSetName( setName ) # if not found, ind = -1
@@ -130,6 +398,7 @@ class CircularSociety:
             newSet = Set( setName, left_endpt, right_endpt, self.modulo )
             
             # Update attributes
+            self._setIndex[ setName ] = self.numVoters + len( self._removedSlots )
             self.approvalSets.append( newSet )
             self.numVoters += 1
             
@@ -137,21 +406,56 @@ class CircularSociety:
             self.list_setnames.append( setName )
             self.list_left_endpts.append( left_endpt )
             self.list_right_endpts.append( right_endpt )
+            self._recordChange( (True, self.numVoters - 1, left_endpt, right_endpt) )
             
         else:
             print("Set is not added because this set name has already been chosen.  Please pick a different set name.")
+    
+    # Method to add many new approval sets into the society at once
+    #   setNames: list of names;  left_endpts, right_endpts: lists or arrays of endpoints (same length as setNames)
+    #   The names are validated once for the whole batch; if any name is repeated or already chosen, no set is added
+    @_instrumented
+    def addApprovalSets( self, setNames, left_endpts, right_endpts ):
+        setNames = list( setNames )
+        left_endpts = np.asarray( left_endpts ).tolist()
+        right_endpts = np.asarray( right_endpts ).tolist()
+        if len( left_endpts ) != len( setNames ) or len( right_endpts ) != len( setNames ):
+            raise ValueError( "setNames, left_endpts and right_endpts must have the same length" )
+        
+        if len( set( setNames ) ) < len( setNames ) or any( name in self._setIndex for name in setNames ):
+            print("Sets are not added because some set names are repeated or have already been chosen.  Please pick different set names.")
+            return
+        
+        firstSlot = self.numVoters + len( self._removedSlots )
+        self._setIndex.update( zip( setNames, range( firstSlot, firstSlot + len(setNames) ) ) )
+        self.approvalSets.extend( [ Set( name, left, right, self.modulo ) for name, left, right in zip( setNames, left_endpts, right_endpts ) ] )
+        self.numVoters += len( setNames )
+        self.list_setnames.extend( setNames )
+        self.list_left_endpts.extend( left_endpts )
+        self.list_right_endpts.extend( right_endpts )
+        self._recordChange()
+        self._endpointOrder = None # rebuilt (sorted) on the next use
 
     # Method to remove an approval set from the society
+    @_instrumented
     def removeApprovalSet( self, setName ):
-        for ind, A in enumerate( self.approvalSets ):
-            if setName == A.name:
-                self.approvalSets.pop(ind)
-                self.list_setnames.pop(ind)
-                self.list_left_endpts.pop(ind)
-                self.list_right_endpts.pop(ind)
-                self.numVoters -= 1
+        ind = self.findApprovalSetName( setName ) # if not found, ind = -1
+        if ind != -1:
+            self.approvalSets.pop(ind)
+            self.list_setnames.pop(ind)
+            left_endpt = self.list_left_endpts.pop(ind)
+            right_endpt = self.list_right_endpts.pop(ind)
+            self.numVoters -= 1
+            self._recordChange( (False, ind, left_endpt, right_endpt, True) )
+            
+            # Sets after the removed one move up by one position (see _setIndex)
+            bisect.insort( self._removedSlots, self._setIndex.pop( setName ) )
+            if len( self._removedSlots ) > 1024:
+                self._setIndex = dict( zip( self.list_setnames, range( self.numVoters ) ) )
+                self._removedSlots = []
     
     # Method to edit the endpoints of an approval set
+    @_instrumented
     def editApprovalSet( self, setName, newleft_endpt, newright_endpt ):
         ind = self.findApprovalSetName( setName ) # if not found, ind = -1
         
@@ -160,140 +464,256 @@ class CircularSociety:
         else:
             A = self.approvalSets[ind]
             A.editSet( setName, newleft_endpt, newright_endpt, self.modulo )
+            self._recordChange( (False, ind, self.list_left_endpts[ind], self.list_right_endpts[ind]),
+                                (True, ind, newleft_endpt, newright_endpt) )
             self.list_left_endpts[ind] = newleft_endpt
             self.list_right_endpts[ind] = newright_endpt
     
     
     ### AGREEABILITY, AGREEMENT NUMBER, PIERCING NUMBER -----------------------
     
-    # Method to check (k, m) agreeability (brute force)
-    def checkAgreeability( self, k, m):
-      setNames = [ A.name for A in self.approvalSets ]
-      subcollections_m = [list(i) for i in itertools.combinations(setNames, m)]
-      good = [] # is the society k,m agreeable? will store 1 or 0 for each collection of m sets
-      bad_m_sets = []
-      for collection in subcollections_m:
-        good_m_sets = [] # will store 1 or 0 for each collection of k sets
-        subcollections_k = [list(i) for i in itertools.combinations(collection, k)]
-        for collection1 in subcollections_k:
-          setname = collection1[0]
-          A = self.getSet(setname)
-          left = A.left_endpt
-          left_list = np.array([self.getSet(setname1).isPointInSet(left) for setname1 in collection1 ])
-          left_good = np.prod(left_list)
-          right = A.right_endpt
-          right_list = np.array([self.getSet(setname1).isPointInSet(right) for setname1 in collection1 ])
-          right_good = np.prod(right_list)
-          set_good = 1 - ( (1-left_good) * (1-right_good) ) # good if at least one is good
-          good_m_sets.append(set_good)
-        good_m_sets = np.array(good_m_sets)
-        good_m = 1 - np.prod(1-good_m_sets) # good if at least one is good
-        if good_m == 0:
-          bad_m_sets.append(collection)
-        good.append(good_m)
-      good = np.array(good)
-      is_kmagreeable = np.prod(good) # good if all is good
-      return is_kmagreeable, bad_m_sets
+    # Method to check (k, m) agreeability
+    #   The society is (k, m)-agreeable when every collection of m approval sets contains k sets with a common point.
+    #   A collection of m sets is bad exactly when no point lies in k of its sets, and any m sets taken from a
+    #   subcollection with that property form a bad collection.  So it suffices to find a largest subcollection in
+    #   which no point lies in k sets (see _largestSubcollectionBelowDepth), instead of enumerating all collections.
+    # returns True/False, and a list containing one bad collection of m sets (empty if the society is (k, m)-agreeable)
+    @_instrumented
+    def checkAgreeability( self, k, m ):
+      N = self.numVoters
+      if m > N or k <= 0:
+        return True, [] # there is no collection of m sets, or every collection is trivially good
+      
+      left, right, _ = self.getEndpointArrays()
+      agreement, _ = self.findAgreementNumber()
+      if agreement < k:
+        selected = np.arange( N ) # no point lies in k sets of the whole society
+      else:
+        selected = _largestSubcollectionBelowDepth( left, right, k - 1 )
+      
+      if len( selected ) < m:
+        return True, []
+      bad_m_set = [ self.list_setnames[ind] for ind in selected[:m] ]
+      return False, [ bad_m_set ]
+    
+    # Method to list every bad collection of m sets (collections of m sets with no point in k of them)
+    #   This is a generator: the collections are produced lazily, one at a time, in the order of itertools.combinations
+    def generateBadCollections( self, k, m ):
+      is_kmagreeable, _ = self.checkAgreeability( k, m )
+      if is_kmagreeable:
+        return
+      
+      left, right, _ = self.getEndpointArrays()
+      for collection in itertools.combinations( range( self.numVoters ), m ):
+        collection = list( collection )
+        if k > m or pointsInSets( left[collection], left[collection], right[collection] ).sum( axis = 1 ).max() < k:
+          yield [ self.list_setnames[ind] for ind in collection ]
     
     # Method to the find agreement number (and the location)
-    def findAgreementNumber( self ):
-        Names, Endpts = self.listSetEndpoints()
-        agreement = 0
-        agrement_location = Endpts[0]
+    #   findAllLocations = True: also return every endpoint where the agreement number is attained
+    #   findProfile = True: also return the number of sets containing each point of the circle (see coverageProfile)
+    @_instrumented
+    def findAgreementNumber( self, findAllLocations = False, findProfile = False ):
+        if self._usesResultCache() and not findProfile:
+            # cached as the agreement number and the positions of the endpoints where it is attained
+            _, _, endpts = self.getEndpointOrder()
+            def compute():
+                agreement, _, locations = self.findAgreementNumber( findAllLocations = True, findProfile = True )[:3]
+                return agreement, self._toCanonicalPositions( np.flatnonzero( np.isin( endpts, locations ) ) )
+            agreement, positions = self._cachedResult( 'agreement', compute )
+            locations = np.unique( endpts[ self._fromCanonicalPositions( positions ) ] )
+            output = [ agreement, locations[0] ]
+            if findAllLocations:
+                output.append( locations )
+            return tuple( output )
+        
+        left, right, _ = self.getEndpointArrays()
         
         # At each point, the number of intersecting sets changes only when an endpoint is encountered,
         #  therefore, we will check the number of intersecting sets only at endpoints
-        for i in Endpts:
-          numSets_contain_i = 0
-          
-          for A in self.approvalSets:
-            if A.isPointInSet( i ):
-              numSets_contain_i = numSets_contain_i + 1
-          
-          if numSets_contain_i > agreement:
-            agreement = numSets_contain_i
-            agreement_location = i
-          
-        return agreement, agreement_location
+        coords, pointDepths, gapDepths = coverageProfile( left, right )
+        if len( coords ) == 0:
+            agreement = 0
+            agreement_location = None
+        else:
+            ind = np.argmax( pointDepths )
+            agreement = int( pointDepths[ind] )
+            agreement_location = coords[ind]
+        
+        output = [ agreement, agreement_location ]
+        if findAllLocations:
+            output.append( coords[ pointDepths == agreement ] )
+        if findProfile:
+            output.append( ( coords, pointDepths, gapDepths ) )
+        return tuple( output )
       
-    def findPiercingNumber( self ):
-      # Finding piercing number using an integer linear program (ILP) formulation
-      # (a linear program (LP) that is constrained to have integer solutions)
+    # Method to find the piercing number (and a piercing set)
+    #   method = 'combinatorial' (default): exact greedy sweep over right endpoints, trying every starting set (O(N log N))
+    #   method = 'ILP': integer linear program (useful for cross-checking), solved with
+    #     solver = 'HIGHS' (default): scipy's milp;  solver = 'GLPK_MI': cvxpy with GLPK_MI
+    @_instrumented
+    def findPiercingNumber( self, method = 'combinatorial', solver = 'HIGHS' ):
+      if method == 'ILP':
+        return self._findPiercingNumberILP( solver )
+      elif method != 'combinatorial':
+        raise ValueError( "Unknown method '" + str(method) + "'; use 'combinatorial' or 'ILP'" )
       
-      # First, find constraint matrix/data for LP used to find piercing number
-      # Candidate piercing points are the endpoints of the intervals
-      _, orderedendpts = self.listSetEndpoints()
       N = self.numVoters
-      M = 2*N
-      Mat = np.empty( [ N, M] )
-      for i in np.arange(0, N):
-        for j, p in enumerate(orderedendpts):
-          A = self.approvalSets[i]
-          Mat[i, j] = A.isPointInSet( p )
+      if N == 0:
+        return 0, np.array([]), None, None
+      if self._usesResultCache():
+        # cached as the piercing number and the positions of the piercing points among the endpoints (on a hit, the
+        #   piercing set is the one found for the first society of this type, and may differ from the uncached one)
+        _, _, endpts = self.getEndpointOrder()
+        def compute():
+          piercingNumber, piercingSet = self._findPiercingNumberCombinatorial()
+          positions = np.searchsorted( endpts, piercingSet )
+          return piercingNumber, self._toCanonicalPositions( positions )
+        piercingNumber, positions = self._cachedResult( 'piercing', compute )
+        return piercingNumber, np.sort( endpts[ self._fromCanonicalPositions( positions ) ] ), None, None
+      
+      piercingNumber, piercingSet = self._findPiercingNumberCombinatorial()
+      return piercingNumber, piercingSet, None, None
+    
+    # Method to find the piercing number and a piercing set with the combinatorial algorithm
+    def _findPiercingNumberCombinatorial( self ):
+      left, right, _ = self.getEndpointArrays()
+      return _piercingSet( left, right )
+    
+    # Method to find the piercing number using an integer linear program (ILP) formulation
+    #   minimize sum(x)  subject to  Mat x >= 1,  x in {0, 1}
+    #   where Mat[i, j] = 1 when the j-th candidate piercing point is in the i-th set (see _piercingCandidates)
+    @_instrumented
+    def _findPiercingNumberILP( self, solver = 'HIGHS' ):
+      # Finding piercing number using an integer linear program (ILP) formulation
+      # (a linear program (LP) that is constrained to have integer solutions)
+      if solver not in [ 'HIGHS', 'GLPK_MI' ]:
+        raise ValueError( "Unknown solver '" + str(solver) + "'; use 'HIGHS' or 'GLPK_MI'" )
+      sparse = _importOptional( 'scipy.sparse', "findPiercingNumber( method = 'ILP' )" )
       
-      # Next, vector of coefficients of objective function
-      c = np.ones(M)
+      # First, find the (sparse) constraint matrix for the candidate piercing points
+      with _phase( 'findPiercingNumber(ILP): matrix build' ):
+        left, right, _ = self.getEndpointArrays()
+        candidates = _piercingCandidates( left, right )
+        Mat = _piercingConstraintMatrix( left, right, candidates, sparse )
+      N, K = Mat.shape
+      if N == 0:
+        return 0, np.array([]), np.zeros( 0 ), Mat
       
-      ## Solve ILP using cvxpy
-      x = cp.Variable(M, integer = True)
-      objective = cp.Minimize( cp.matmul(c, x) )
-      constraints = [ cp.matmul(Mat,x) >= np.ones(N), 0 <= x, x <= 1]
-      prob = cp.Problem( objective, constraints )
-      val = prob.solve(solver='GLPK_MI')
-      piercingNumber = int(np.round(val))
-      piercingSet = np.transpose(orderedendpts)[ np.round(x.value) > 0]
+      if solver == 'HIGHS':
+        ## Solve ILP using scipy's milp (HiGHS)
+        optimize = _importOptional( 'scipy.optimize', "findPiercingNumber( method = 'ILP' )" )
+        with _phase( 'findPiercingNumber(ILP): solve' ):
+          result = optimize.milp( np.ones(K), integrality = np.ones(K), bounds = optimize.Bounds( 0, 1 ),
+                                  constraints = optimize.LinearConstraint( Mat, 1, np.inf ) )
+        _recordSolverStatus( 'HiGHS (MILP)', result.status )
+        if result.x is None:
+          raise RuntimeError( "The ILP solver (HiGHS) found no solution (status " + str(result.status) + ": " + str(result.message) + ")" )
+        x = result.x
+      else:
+        ## Solve ILP using cvxpy (the sparse constraint matrix is passed as it is)
+        cp = _importOptional( 'cvxpy', "findPiercingNumber( method = 'ILP', solver = 'GLPK_MI' )" )
+        xVar = cp.Variable( K, boolean = True )
+        prob = cp.Problem( cp.Minimize( cp.sum( xVar ) ), [ Mat @ xVar >= 1 ] )
+        with _phase( 'findPiercingNumber(ILP): solve' ):
+          prob.solve( solver = 'GLPK_MI' )
+        _recordSolverStatus( 'GLPK_MI', prob.status )
+        if xVar.value is None:
+          raise RuntimeError( "The ILP solver (GLPK_MI) found no solution (status " + str(prob.status) + ")" )
+        x = xVar.value
       
-      return piercingNumber, piercingSet, x.value, Mat
+      isChosen = np.round( x ) > 0
+      return int( np.sum( isChosen ) ), candidates[isChosen], x, Mat
     
     # implementing the linear society piercing number algorithm
-    def piercingAlgorithm( self, startingPoint = 0 ):
-
-      orderedendptnames, orderedendpts = self.listSetEndpoints()
-
+    #   startingPoint: the sets are visited in the order of their right endpoints, starting from startingPoint
+    #   allStartingPoints: if True, the algorithm is evaluated from the right endpoint of every set, and the method
+    #     returns the piercing set of the best start, the list of starting points (right endpoints, in set order)
+    #     and the array of sizes of the piercing sets found from each of them
+    # returns the list of [piercing point, names of the sets it covers]
+    @_instrumented
+    def piercingAlgorithm( self, startingPoint = 0, allStartingPoints = False ):
+      if allStartingPoints:
+        N = self.numVoters
+        if N == 0:
+          return [], [], np.zeros( 0, dtype = np.int64 )
+        left, right, _ = self.getEndpointArrays()
+        leftRanks, rightRanks, numDistinct, _, _ = _rankEndpoints( left.reshape(1, N), right.reshape(1, N) )
+        sizes = _greedyPiercingCounts( leftRanks, rightRanks, numDistinct )[0][0]
+        startingPoints = list( self.list_right_endpts )
+        return self.piercingAlgorithm( startingPoints[ np.argmin(sizes) ] ), startingPoints, sizes
+      
+      setIndices, isRight, orderedendpts = self.getEndpointOrder()
+      
       if startingPoint > 0 :
-        temp1 = [ x for x in orderedendpts if x >= startingPoint ]
-        temp1names = [x for i, x in enumerate(orderedendptnames) if orderedendpts[i] >= startingPoint]
-        temp2 = [x for x in orderedendpts if x < startingPoint]
-        temp2names = [x for i, x in enumerate(orderedendptnames) if orderedendpts[i] < startingPoint]
-        orderedendpts = temp1 + temp2
-        orderedendptnames = temp1names + temp2names
-
-      uncovered_setnames = []
-      N = self.numVoters
-      for i in range(0, 2*N):
-        if( orderedendptnames[i][0] == "R" ):
-          uncovered_setnames.append( orderedendptnames[i][1:] )
-
-      # currently, uncovered_setnames contains all sets' names
+        rotation = np.concatenate( ( np.flatnonzero( orderedendpts >= startingPoint ), np.flatnonzero( orderedendpts < startingPoint ) ) )
+        setIndices = setIndices[rotation]
+        isRight = isRight[rotation]
+      
+      # sets are visited in the order of their right endpoints (starting from startingPoint); endpoints are
+      #   replaced by their ranks among the distinct endpoints, counted from startingPoint
+      order = setIndices[isRight]
+      left, right, _ = self.getEndpointArrays()
+      distinctValues = np.unique( orderedendpts )
+      K = len( distinctValues )
+      shift = np.searchsorted( distinctValues, startingPoint )
+      leftRanks = ( ( np.searchsorted( distinctValues, left ) - shift ) % max( K, 1 ) )[order].tolist()
+      rightRanks = ( ( np.searchsorted( distinctValues, right ) - shift ) % max( K, 1 ) )[order].tolist()
+      
+      # a set is covered by the first piercing point in it; since the piercing points so far are at most its right
+      #   endpoint, this is the first one after its left endpoint (or the very first one, if the set wraps around
+      #   startingPoint).  Otherwise, its right endpoint becomes a new piercing point.
+      pointRanks = []
       piercingSet = []
-      while( len(uncovered_setnames) > 0): #while there are uncovered sets
-        current_point = self.getSet(uncovered_setnames[0]).right_endpt
-        covered_setnames = [setname for setname in uncovered_setnames if self.getSet(setname).isPointInSet(current_point) ]
-        uncovered_setnames = [setname for setname in uncovered_setnames if not self.getSet(setname).isPointInSet(current_point) ]
-        piercingSet.append( [current_point, covered_setnames] )
+      for ind, l, r in zip( order.tolist(), leftRanks, rightRanks ):
+        k = 0 if ( l >= r ) else bisect.bisect_left( pointRanks, l )
+        if k < len( pointRanks ):
+          piercingSet[k][1].append( self.list_setnames[ind] )
+        else:
+          pointRanks.append( r )
+          piercingSet.append( [ right[ind], [ self.list_setnames[ind] ] ] )
       return piercingSet
 
 
+    ### STORING THE CIRCULAR SOCIETY -----------------------------------------
+    
+    # Method to save the society to a binary file (see Part 6; load it with loadSociety)
+    #   includeResults: if True, the agreement number and the piercing number are computed and stored as well
+    @_instrumented
+    def save( self, filename, includeResults = False ):
+      names = [ name.encode( 'utf-8' ) for name in self.list_setnames ]
+      columns = { 'left_endpts': np.asarray( self.list_left_endpts ),
+                  'right_endpts': np.asarray( self.list_right_endpts ),
+                  'names': np.frombuffer( b''.join( names ), dtype = np.uint8 ),
+                  'nameOffsets': np.cumsum( [0] + [ len(name) for name in names ], dtype = np.int64 ) }
+      for key in [ 'left_endpts', 'right_endpts' ]:
+        if columns[key].dtype.kind not in 'iuf':
+          columns[key] = columns[key].astype( float )
+      
+      header = { 'kind': 'society', 'name': self.name, 'modulo': self.modulo, 'tick': self.tick }
+      if includeResults:
+        header['results'] = { 'agreementNumber': int( self.findAgreementNumber()[0] ),
+                              'piercingNumber': int( self.findPiercingNumber()[0] ) }
+      _writeColumns( filename, header, columns )
+    
+    
     ### HARDIN'S TRANSFORMATIONS (ELIMINATE CONTAINMENT, LR-ALTERNATION)-------
     
     # Method to check if Left-Right-alternating
+    @_instrumented
     def is_LR_alt( self, findRRL = False ):
-        L = self.listSetEndpoints()
-        numEndpts = len(L[0])
+        setIndices, isRight, _ = self.getEndpointOrder()
         
         # determine if LR alternating; if findRRL is True, also find names of sets where of RRL endpoints occur
-        isLR = True
-        RRLsets = list()
-        for i in range(0, numEndpts):
-            # determine if LR alternating
-            if L[0][i][0] == L[0][(i+1)%numEndpts][0]:
-                isLR = False
-            # find names of sets where of RRL endpoints occur
-            if ( findRRL ):
-                if(L[0][i%numEndpts][0] == "R" and L[0][(i+1)%numEndpts][0] == "R" and L[0][(i+2)%numEndpts][0] == "L"):
-                    RRLsets.append( [ L[0][i%numEndpts][1:], L[0][(i+1)%numEndpts][1:], L[0][(i+2)%numEndpts][1:] ])
+        isLR = not np.any( isRight == np.roll( isRight, -1 ) )
         
         if findRRL:
+          # find names of sets where of RRL endpoints occur
+          RRLsets = list()
+          starts = np.flatnonzero( isRight & np.roll( isRight, -1 ) & ~np.roll( isRight, -2 ) )
+          numEndpts = len( isRight )
+          for i in starts:
+              RRLsets.append( [ self.list_setnames[ setIndices[ (i+j) % numEndpts ] ] for j in range(3) ] )
           return isLR, RRLsets
         else:
           return isLR
@@ -312,7 +732,11 @@ class CircularSociety:
         A1 = self.approvalSets[indSet1]
         A2 = self.approvalSets[indSet2]
         
-        if( A1.left_endpt <= A1.right_endpt and A2.left_endpt <= A2.right_endpt): 
+        if( A1.left_endpt == A1.right_endpt or A2.left_endpt == A2.right_endpt ):
+          # Case 0: a set whose endpoints coincide is the whole circle, and contains the other set
+          containmentIsFound = True
+          
+        elif( A1.left_endpt <= A1.right_endpt and A2.left_endpt <= A2.right_endpt): 
           # Case 1: A1, A2 both don't wrap around
           if( A1.left_endpt <= A2.left_endpt and A2.right_endpt <= A1.right_endpt ):
             containmentIsFound = True # A2 is contained in A1
@@ -341,26 +765,17 @@ class CircularSociety:
       return containmentIsFound
     
     # Method to detect any containent and identifying pairs
+    #   findContainmentPairs: if True, also returns the list of all pairs [containedSetName, containerSetName]
+    #   (see _containmentPairs; O(N log N + K) for K pairs)
+    @_instrumented
     def checkContainmentAll( self, findContainmentPairs = False ):
-      N = self.numVoters
-      approvalSetNames = self.list_setnames
-      containmentPairs = []
-      containmentIsFound = False
+      left, right, _ = self.getEndpointArrays()
+      if not findContainmentPairs:
+        return _containmentPairs( left, right, self.modulo, findContainmentPairs = False )
       
-      for i in np.arange(0, N):
-        setName1 = self.list_setnames[i]
-        for j in np.arange(i+1, N):
-          setName2 = self.list_setnames[j]
-          
-          if ( self.checkContainmentPair( [setName1, setName2]) ):
-            
-            containmentPairs.append( [setName1, setName2] )
-            containmentIsFound = True
-            
-      if findContainmentPairs:
-        return containmentIsFound, containmentPairs
-      else:
-        return containmentIsFound
+      pairs = _containmentPairs( left, right, self.modulo, findContainmentPairs = True )
+      containmentPairs = [ [self.list_setnames[i], self.list_setnames[j]] for i, j in pairs ]
+      return len( containmentPairs ) > 0, containmentPairs
     
     # Method to eliminate a pair of containment
     def eliminateContainmentPair( self, containmentPair ):
@@ -384,18 +799,50 @@ class CircularSociety:
             self.editApprovalSet( largeSetName, ALarge.left_endpt, large_newright_endpt )
 
     # Method to eliminate all containments
+    #   Swapping the right endpoints of a contained set and its container does not change the number of sets
+    #   containing each point, and a society without containment is determined by these numbers: the j-th left
+    #   endpoint (from 0) is paired with the (j + W)-th right endpoint, cyclically, where W is the number of sets
+    #   that wrap around.  So all containments are eliminated in a single pass, by re-pairing the right endpoints.
+    #   When approval sets share endpoints the re-paired sets can still have containment; repeated
+    #   eliminateContainmentPair is then used instead.
+    # returns the list of transformation steps [setName, [old_left, old_right], [new_left, new_right]]
+    @_instrumented
     def eliminateContainmentAll( self ):
+      N = self.numVoters
+      left, right, wraps = self.getEndpointArrays()
+      if not _containmentPairs( left, right, self.modulo, findContainmentPairs = False ):
+        return []
+      leftOrder = np.argsort( left, kind = 'stable' )
+      rightOrder = np.argsort( right, kind = 'stable' )
+      rightSource = np.empty( N, dtype = np.int64 )
+      rightSource[leftOrder] = rightOrder[ ( np.arange(N) + np.sum(wraps) ) % max( N, 1 ) ]
       
-      containmentIsFound, containmentPairs = self.checkContainmentAll( findContainmentPairs = True)
-      maxIt = 100
+      # the new endpoints are checked before the society is changed
+      newRight = [ self.list_right_endpts[j] for j in rightSource ]
+      if _containmentPairs( left, right[rightSource], self.modulo, findContainmentPairs = False ):
+        newRight = self._eliminateContainmentPairwise( )
+      steps = self._assignEndpoints( list( self.list_left_endpts ), newRight )
+      _count( 'eliminateContainmentAll: sets re-paired', len( steps ) )
+      return steps
+
+    # Method to eliminate containment by rounds of .eliminateContainmentPair( ) over all the pairs found, as the
+    #   original implementation did.  It is used when approval sets share endpoints, where the single pass above can
+    #   leave containment; it stops after maxIt rounds, so containment can remain (uniformize checks the final
+    #   society).  The society is left unchanged.
+    # returns the new right endpoints (the left endpoints do not change)
+    def _eliminateContainmentPairwise( self, maxIt = 100 ):
+      oldLeft, oldRight = list( self.list_left_endpts ), list( self.list_right_endpts )
+      containmentIsFound, containmentPairs = self.checkContainmentAll( findContainmentPairs = True )
       it = 0
-      
-      while(containmentIsFound and it < maxIt):
+      while containmentIsFound and it < maxIt:
         for setPair in containmentPairs:
           self.eliminateContainmentPair( setPair )
         containmentIsFound, containmentPairs = self.checkContainmentAll( findContainmentPairs = True )
         it = it + 1
-      
+      newRight = list( self.list_right_endpts )
+      self._assignEndpoints( oldLeft, oldRight ) # restore the society
+      _count( 'eliminateContainmentAll: pairwise rounds', it )
+      return newRight
             
     # Method to eliminate a set of RRL endpoints
     def eliminateRRLTriple( self, RRLsets ):
@@ -419,30 +866,112 @@ class CircularSociety:
             self.editApprovalSet( Set3Name, set3_newleft_endpt, A3.right_endpt )
     
     # Method to eliminate all RRL (to achieve LR-alternation)
+    #   Each RRL -> RLR swap moves a left endpoint back past one right endpoint.  Writing g_i for the number of
+    #   right endpoints just before the i-th left endpoint, a swap moves one unit from g_i (when g_i >= 2) to
+    #   g_(i+1), and the society is LR-alternating when every g_i = 1.  The number of swaps across each left
+    #   endpoint is then f_i = S_i - min(S), where S_i = (g_0 - 1) + ... + (g_i - 1), whatever order the swaps
+    #   are made in; left and right endpoints keep their cyclic orders.  So the final society is computed
+    #   directly, in a single pass.  (maxIt is no longer used, and is kept for compatibility.)
+    # returns the list of transformation steps [setName, [old_left, old_right], [new_left, new_right]]
+    @_instrumented
     def eliminateRRLAll( self, maxIt = 10000 ):
-        isLR, RRLsets = self.is_LR_alt( findRRL = True )
+        setIndices, isRight, _ = self.getEndpointOrder()
+        numEndpts = len( isRight )
+        if numEndpts == 0 or self.is_LR_alt():
+          return []
+        
+        leftPositions = np.flatnonzero( ~isRight )
+        gaps = np.diff( leftPositions, prepend = leftPositions[-1] - numEndpts ) - 1
+        cumulativeGaps = np.cumsum( gaps - 1 )
+        fixed = np.argmin( cumulativeGaps ) # this left endpoint never moves
+        _count( 'eliminateRRLAll: RRL swaps', int( np.sum( cumulativeGaps - cumulativeGaps[fixed] ) ) )
         
-        numIt = 0
-        while( not isLR and numIt < maxIt):
-          for triple in RRLsets:
-            self.eliminateRRLTriple( triple )
-          isLR, RRLsets = self.is_LR_alt( findRRL = True )
-          numIt = numIt + 1
+        # Cut the circle just after the fixed left endpoint: in the final society, right and left endpoints
+        #   alternate (R, L, R, L, ...) along the cut circle, in their original orders
+        slots = ( leftPositions[fixed] + 1 + np.arange( numEndpts ) ) % numEndpts
+        slotValues = [ self.list_right_endpts[ind] if r else self.list_left_endpts[ind] for ind, r in zip( setIndices[slots].tolist(), isRight[slots].tolist() ) ]
+        rightSets = setIndices[slots][ isRight[slots] ]
+        leftSets = setIndices[slots][ ~isRight[slots] ]
+        newLeft = list( self.list_left_endpts )
+        newRight = list( self.list_right_endpts )
+        for k in range( len(leftSets) ):
+          newRight[ rightSets[k] ] = slotValues[ 2*k ]
+          newLeft[ leftSets[k] ] = slotValues[ 2*k + 1 ]
         
-        if ( not isLR ):
-          print("Max iteration reached but the society is still not LR-Alternating")
+        oldLeft, oldRight = list( self.list_left_endpts ), list( self.list_right_endpts )
+        steps = self._assignEndpoints( newLeft, newRight )
+        if not self.is_LR_alt():
+          self._assignEndpoints( oldLeft, oldRight ) # restore the society
+          raise RuntimeError( "The society could not be made LR-alternating; this happens when approval sets share endpoints" )
+        return steps
 
     # Method to transform into a uniform society
+    #   with shared endpoints, eliminating containment first can fail where eliminating RRL first (then containment,
+    #   then RRL again) reaches a uniform society, so both orders are tried
+    #   raises RuntimeError if the result is not a uniform society (no containment, LR-alternating); the society
+    #   is then left unchanged
+    # returns the list of transformation steps [setName, [old_left, old_right], [new_left, new_right]] (with the
+    #   second order, the overall changes of the sets)
+    @_instrumented
     def uniformize( self ):
-        self.eliminateContainmentAll()
-        self.eliminateRRLAll()
+        oldLeft, oldRight = list( self.list_left_endpts ), list( self.list_right_endpts )
+        try:
+          steps = self.eliminateContainmentAll()
+          steps = steps + self.eliminateRRLAll()
+          if self.checkContainmentAll():
+            raise RuntimeError( "The society could not be made uniform; this happens when approval sets share endpoints" )
+          return steps
+        except RuntimeError:
+          self._assignEndpoints( oldLeft, oldRight ) # restore the society
         
-
+        try:
+          self.eliminateRRLAll()
+          self.eliminateContainmentAll()
+          self.eliminateRRLAll()
+          if self.checkContainmentAll():
+            raise RuntimeError( "The society could not be made uniform; this happens when approval sets share endpoints" )
+        except RuntimeError:
+          self._assignEndpoints( oldLeft, oldRight ) # restore the society
+          raise
+        newLeft, newRight = list( self.list_left_endpts ), list( self.list_right_endpts )
+        self._assignEndpoints( oldLeft, oldRight )
+        return self._assignEndpoints( newLeft, newRight )
+    
+    # Method to replace the endpoints of all sets at once
+    # returns the list of changes [setName, [old_left, old_right], [new_left, new_right]]
+    def _assignEndpoints( self, newLeft, newRight ):
+        steps = []
+        for ind, A in enumerate( self.approvalSets ):
+          if newLeft[ind] != A.left_endpt or newRight[ind] != A.right_endpt:
+            steps.append( [ A.name, [A.left_endpt, A.right_endpt], [newLeft[ind], newRight[ind]] ] )
+            A.editSet( A.name, newLeft[ind], newRight[ind], self.modulo )
         
+        if len( steps ) > 0:
+          self.list_left_endpts = list( newLeft )
+          self.list_right_endpts = list( newRight )
+          self._recordChange()
+          self._endpointOrder = None # rebuilt (sorted) on the next use
+        return steps
+    
     ### VISUALIZATION --------------------------------------------------------
     
     # Method to visualize the sets
-    def visualize( self, drawAgreement = False, drawPiercing = False ):
+    #   drawAgreement, drawPiercing: draw a point that attains the agreement number, and the piercing points
+    #   agreementResult, piercingResult: (Optional) outputs of findAgreementNumber and findPiercingNumber, used
+    #     instead of computing them again
+    #   mode = 'sets': each set is plotted horizontally (different y coordinates for different sets)
+    #   mode = 'density': the number of sets containing each point is plotted (see coverageProfile)
+    #   mode = 'auto' (default): 'sets' for at most densityThreshold sets, and 'density' otherwise
+    @_instrumented
+    def visualize( self, drawAgreement = False, drawPiercing = False, agreementResult = None, piercingResult = None,
+                   mode = 'auto', densityThreshold = 500 ):
+        
+        plt = _importOptional( 'matplotlib.pyplot', "visualize( )" )
+        collections = _importOptional( 'matplotlib.collections', "visualize( )" )
+        if mode == 'auto':
+            mode = 'sets' if self.numVoters <= densityThreshold else 'density'
+        elif mode not in [ 'sets', 'density' ]:
+            raise ValueError( "Unknown mode '" + str(mode) + "'; use 'auto', 'sets' or 'density'" )
         
         ## Set up grid
         fig = plt.figure()
@@ -457,37 +986,529 @@ class CircularSociety:
         # Different thickness settings for the major and minor grids:
         ax.grid(which='minor', alpha=0.2)
         ax.grid(which='major', alpha=0.5)
-        plt.yticks(np.arange(0, self.numVoters+1, step = 1) )
         
-        # Draw the intervals
-        for ind, A in enumerate( self.approvalSets ):
-            if A.left_endpt <= A.right_endpt:
-                x = [A.left_endpt, A.right_endpt]
-                y = [ind+1, ind+1]
-                plt.plot( x, y, 'ro-')
-            else:
-                x = [A.left_endpt, self.modulo]
-                y = [ind+1, ind+1]
-                plt.plot( A.left_endpt, ind+1, 'ro-', self.modulo, ind+1, 'r>-')
-                plt.plot( x, y, 'r')
-                x = [0, A.right_endpt]
-                plt.plot( 0, ind+1, 'r<-', A.right_endpt, ind+1, 'ro-')
-                plt.plot( x, y, 'r')
+        left, right, wraps = self.getEndpointArrays()
+        if mode == 'sets':
+            plt.yticks(np.arange(0, self.numVoters+1, step = max( 1, self.numVoters // 20 )) ) # at most ~20 labels
+            height = self.numVoters
+            
+            # Draw the intervals, all at once; a set that wraps around is split into [left, modulo] and [0, right]
+            y = np.arange( 1, self.numVoters+1, dtype = float )
+            segmentsLeft = np.concatenate( ( left, np.zeros( np.sum(wraps) ) ) )
+            segmentsRight = np.concatenate( ( np.where( wraps, self.modulo, right ), right[wraps] ) )
+            segmentsY = np.concatenate( ( y, y[wraps] ) )
+            segments = np.stack( ( np.column_stack( (segmentsLeft, segmentsY) ), np.column_stack( (segmentsRight, segmentsY) ) ), axis = 1 )
+            ax.add_collection( collections.LineCollection( segments, colors = 'r' ) )
+            ax.plot( np.concatenate( (left, right) ), np.concatenate( (y, y) ), 'ro' )
+            ax.plot( np.full( np.sum(wraps), self.modulo ), y[wraps], 'r>' )
+            ax.plot( np.zeros( np.sum(wraps) ), y[wraps], 'r<' )
+            ax.autoscale_view()
+            agreementBottom = 0.8
+        else:
+            # Draw the number of sets containing the points between consecutive endpoints (a step function)
+            coords, pointDepths, gapDepths = coverageProfile( left, right )
+            if len( coords ) == 0:
+                coords, gapDepths = np.zeros( 1 ), np.zeros( 1, dtype = np.int64 )
+            x = np.concatenate( ( [0], coords, [self.modulo] ) )
+            depths = np.concatenate( ( gapDepths[-1:], gapDepths, gapDepths[-1:] ) )
+            ax.fill_between( x, depths, step = 'post', color = 'r', alpha = 0.3 )
+            ax.step( x, depths, 'r', where = 'post' )
+            ax.set_ylabel( "Number of sets" )
+            height = max( np.max( pointDepths, initial = 0 ), 1 )
+            agreementBottom = 0
                 
         # Draw one of the points that attains agreement number
         if drawAgreement:
-            a, pos = self.findAgreementNumber()
-            plt.plot( [pos, pos], [0.8, self.numVoters], 'blue' )
+            if agreementResult is None:
+                agreementResult = self.findAgreementNumber()
+            a, pos = agreementResult[:2]
+            if pos is not None:
+                ax.plot( [pos, pos], [agreementBottom, a if mode == 'density' else height], 'blue' )
         
         # Draw the piercing points
         if drawPiercing:
-          piercingNum, piercingSet, _, _ = self.findPiercingNumber()
-          for pos in piercingSet:
-            plt.plot( [pos, pos], [0, 0.2 + self.numVoters], 'green', linestyle = 'dashed' )
+          if piercingResult is None:
+            piercingResult = self.findPiercingNumber()
+          piercingSet = piercingResult[1]
+          ax.vlines( piercingSet, 0, 0.2 + height, colors = 'green', linestyles = 'dashed' )
+
+# Define the DynamicCircularSociety class
+#   A circular society that keeps its agreement number up to date as approval sets are added, removed and edited.
+#   By the formula used in coverageProfile, the number of sets containing a point c is
+#     W + #{left endpoints <= c} - #{right endpoints < c},
+#   where W is the number of sets that wrap around.  The endpoints are kept in a balanced binary search tree
+#   (a treap) as events sorted by (endpoint, L before R), with weight +1 for left and -1 for right endpoints; each
+#   subtree stores the sum of its weights and the largest prefix sum of its events (with where it is attained).
+#   The agreement number is then W plus the largest prefix sum of the whole tree, read at the root.  Every change
+#   updates O(log N) nodes, and the number of sets containing any point is found in O(log N) time (depthAt).
+#   Adding and editing a set take O(log N) time overall; removing a set also removes it from the lists of the
+#   society (which keep the sets in order), and so takes O(N) time, although it only updates O(log N) nodes.
+#   Sets whose endpoints coincide cover the whole circle: they only count in W (with an event of weight 0).
+class DynamicCircularSociety( CircularSociety ):
+    
+    # Initialize Class
+    def __init__( self, name, modulo, isUniform = 0, tick = 0.5 ):
+        super().__init__( name, modulo, isUniform = isUniform, tick = tick )
+        self._eventTree = None
+        self._numWrapping = 0
+        self._random = random.Random( 0 ) # priorities of the tree nodes
+    
+    # Method to create a dynamic copy of a circular society
+    @classmethod
+    def fromSociety( cls, CS ):
+        DCS = cls( CS.name, CS.modulo, tick = CS.tick )
+        DCS.addApprovalSets( CS.list_setnames, CS.list_left_endpts, CS.list_right_endpts )
+        return DCS
+    
+    # Method to obtain the events (key, weight) of an approval set; keys are (endpoint, 0 for L / 1 for R, set name)
+    def _setEvents( self, setName, left_endpt, right_endpt ):
+        if left_endpt == right_endpt:
+            return [ ( (float(right_endpt), 1, setName), 0 ) ]
+        return [ ( (float(left_endpt), 0, setName), 1 ), ( (float(right_endpt), 1, setName), -1 ) ]
+    
+    def _insertSet( self, setName, left_endpt, right_endpt ):
+        for key, weight in self._setEvents( setName, left_endpt, right_endpt ):
+            self._eventTree = _treapInsert( self._eventTree, _TreapNode( key, weight, self._random.random() ) )
+        self._numWrapping += int( right_endpt <= left_endpt )
+    
+    def _deleteSet( self, setName, left_endpt, right_endpt ):
+        for key, _ in self._setEvents( setName, left_endpt, right_endpt ):
+            self._eventTree = _treapDelete( self._eventTree, key )
+        self._numWrapping -= int( right_endpt <= left_endpt )
+    
+    def _rebuildEvents( self ):
+        left, right, wraps = self.getEndpointArrays()
+        isFull = left == right
+        names = np.array( self.list_setnames )
+        coords = np.concatenate( ( left[~isFull], right ) )
+        isRight = np.concatenate( ( np.zeros( np.sum(~isFull), dtype = np.int64 ), np.ones( len(right), dtype = np.int64 ) ) )
+        eventNames = np.concatenate( ( names[~isFull], names ) )
+        weights = np.concatenate( ( np.ones( np.sum(~isFull), dtype = np.int64 ), np.where( isFull, 0, -1 ) ) )
+        order = np.lexsort( ( eventNames, isRight, coords ) )
+        keys = list( zip( coords[order].tolist(), isRight[order].tolist(), eventNames[order].tolist() ) )
+        self._eventTree = _treapBuild( keys, weights[order].tolist(), self._random )
+        self._numWrapping = int( np.sum( wraps ) )
+    
+    ### FINDING, EDITING, ADDING, REMOVING APPROVAL SETS (the tree is updated with the lists)
+    
+    def addApprovalSet( self, setName, left_endpt, right_endpt ):
+        numVoters = self.numVoters
+        super().addApprovalSet( setName, left_endpt, right_endpt )
+        if self.numVoters > numVoters:
+            self._insertSet( setName, left_endpt, right_endpt )
+    
+    def addApprovalSets( self, setNames, left_endpts, right_endpts ):
+        numVoters = self.numVoters
+        super().addApprovalSets( setNames, left_endpts, right_endpts )
+        if self.numVoters > numVoters:
+            if numVoters == 0:
+                self._rebuildEvents() # built from the sorted events in O(N)
+            else:
+                for setName, left, right in zip( self.list_setnames[numVoters:], self.list_left_endpts[numVoters:], self.list_right_endpts[numVoters:] ):
+                    self._insertSet( setName, left, right )
+    
+    def removeApprovalSet( self, setName ):
+        A = self.getSet( setName )
+        if A is not None:
+            self._deleteSet( setName, A.left_endpt, A.right_endpt )
+        super().removeApprovalSet( setName )
+    
+    def editApprovalSet( self, setName, newleft_endpt, newright_endpt ):
+        A = self.getSet( setName )
+        if A is not None:
+            self._deleteSet( setName, A.left_endpt, A.right_endpt )
+            self._insertSet( setName, newleft_endpt, newright_endpt )
+        super().editApprovalSet( setName, newleft_endpt, newright_endpt )
+    
+    def _assignEndpoints( self, newLeft, newRight ):
+        steps = super()._assignEndpoints( newLeft, newRight )
+        if len( steps ) > 0:
+            self._rebuildEvents()
+        return steps
+    
+    ### AGREEMENT NUMBER
+    
+    # Method to the find agreement number (and the location), in O(log N) time
+    #   (with findAllLocations or findProfile, the agreement number is computed from scratch, see CircularSociety)
+    def findAgreementNumber( self, findAllLocations = False, findProfile = False ):
+        if findAllLocations or findProfile or self._eventTree is None:
+            return super().findAgreementNumber( findAllLocations = findAllLocations, findProfile = findProfile )
+        
+        root = self._eventTree
+        if root.best > 0:
+            return self._numWrapping + root.best, root.bestKey[0]
+        
+        # the largest number of sets is W, first attained at the first endpoint
+        node = root
+        while node.left is not None:
+            node = node.left
+        return self._numWrapping, node.key[0]
+    
+    # Method to find the number of sets containing the point x, in O(log N) time
+    def depthAt( self, x ):
+        depth = self._numWrapping
+        node = self._eventTree
+        while node is not None:
+            if node.key[0] < x or ( node.key[0] == x and node.key[1] == 0 ):
+                depth += ( node.left.sum if node.left is not None else 0 ) + node.weight
+                node = node.right
+            else:
+                node = node.left
+        return depth
+
+# Treap (randomized balanced binary search tree) of weighted events, for DynamicCircularSociety
+#   Each node stores the sum of the weights of its subtree, the largest prefix sum of its subtree (best) and the
+#   key of the first event where it is attained (bestKey)
+class _TreapNode:
+    __slots__ = [ 'key', 'weight', 'priority', 'left', 'right', 'sum', 'best', 'bestKey' ]
+    
+    def __init__( self, key, weight, priority ):
+        self.key = key
+        self.weight = weight
+        self.priority = priority
+        self.left = None
+        self.right = None
+        self.sum = weight
+        self.best = weight
+        self.bestKey = key
+
+def _treapUpdate( node ):
+    left, right = node.left, node.right
+    if left is None:
+        prefix = node.weight
+        best, bestKey = prefix, node.key
+    else:
+        prefix = left.sum + node.weight
+        best, bestKey = left.best, left.bestKey
+        if prefix > best:
+            best, bestKey = prefix, node.key
+    if right is not None:
+        if prefix + right.best > best:
+            best, bestKey = prefix + right.best, right.bestKey
+        prefix += right.sum
+    node.sum, node.best, node.bestKey = prefix, best, bestKey
+    return node
+
+# Function to split a treap into the events with keys < key, and the events with keys >= key
+def _treapSplit( node, key ):
+    if node is None:
+        return None, None
+    if node.key < key:
+        node.right, right = _treapSplit( node.right, key )
+        return _treapUpdate( node ), right
+    left, node.left = _treapSplit( node.left, key )
+    return left, _treapUpdate( node )
+
+# Function to merge two treaps (all keys of the first one are smaller)
+def _treapMerge( left, right ):
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.priority > right.priority:
+        left.right = _treapMerge( left.right, right )
+        return _treapUpdate( left )
+    right.left = _treapMerge( left, right.left )
+    return _treapUpdate( right )
+
+def _treapInsert( root, node ):
+    left, right = _treapSplit( root, node.key )
+    return _treapMerge( _treapMerge( left, node ), right )
+
+def _treapDelete( root, key ):
+    left, right = _treapSplit( root, key )
+    return _treapMerge( left, _treapDeleteFirst( right ) ) # the first event of right has this key
+
+def _treapDeleteFirst( node ):
+    if node.left is None:
+        return node.right
+    node.left = _treapDeleteFirst( node.left )
+    return _treapUpdate( node )
+
+# Function to build a balanced treap from sorted keys and their weights, in O(N) time
+#   (each node takes the largest priority of its subtree, so that the priorities are in heap order)
+def _treapBuild( keys, weights, rng, start = 0, stop = None ):
+    if stop is None:
+        stop = len( keys )
+    if start >= stop:
+        return None
+    mid = ( start + stop ) // 2
+    node = _TreapNode( keys[mid], weights[mid], rng.random() )
+    node.left = _treapBuild( keys, weights, rng, start, mid )
+    node.right = _treapBuild( keys, weights, rng, mid + 1, stop )
+    for child in ( node.left, node.right ):
+        if child is not None and child.priority > node.priority:
+            node.priority = child.priority
+    return _treapUpdate( node )
+
+# Part 2 - vectorized kernels on endpoint arrays ----------------------------------
+
+# Function to build the boolean containment matrix of a collection of points and a collection of sets
+#   points: array of M points in [0, modulo)
+#   left_endpts, right_endpts: arrays of N endpoints (a set wraps around when right_endpt <= left_endpt)
+# returns an M x N boolean array whose entry [i, j] is True when points[i] is in the j-th set
+def pointsInSets( points, left_endpts, right_endpts ):
+    points = np.asarray( points, dtype = float ).reshape( -1, 1 )
+    left = np.asarray( left_endpts, dtype = float ).reshape( 1, -1 )
+    right = np.asarray( right_endpts, dtype = float ).reshape( 1, -1 )
+    
+    afterLeft = left <= points
+    beforeRight = points <= right
+    return np.where( right <= left, afterLeft | beforeRight, afterLeft & beforeRight )
+
+# Function to compute the coverage profile (number of sets containing each point) of a collection of sets
+#   left_endpts, right_endpts: arrays of N endpoints (a set wraps around when right_endpt <= left_endpt)
+# returns three arrays:
+#   coords: the distinct endpoints, in increasing order
+#   pointDepths: pointDepths[i] is the number of sets containing coords[i]
+#   gapDepths: gapDepths[i] is the number of sets containing the points strictly between coords[i] and coords[i+1]
+#              (the last entry is for the points after coords[-1], going around through 0 to coords[0])
+@_instrumented
+def coverageProfile( left_endpts, right_endpts ):
+    left = np.asarray( left_endpts, dtype = float ).ravel()
+    right = np.asarray( right_endpts, dtype = float ).ravel()
+    coords = np.unique( np.concatenate( (left, right) ) )
+    
+    # Sweep from 0: sets that wrap around are already open at 0, a set opens at its left endpoint and
+    #   closes just after its right endpoint.  Sets whose endpoints coincide contain every point, so they
+    #   only contribute to the count of sets that are open at 0.
+    full = left == right
+    numOpenAtZero = np.sum( right <= left )
+    sortedLeft = np.sort( left[~full] )
+    sortedRight = np.sort( right[~full] )
+    
+    # Endpoints are closed: at a point c, count the sets opened at or before c and closed strictly before c
+    numOpened = np.searchsorted( sortedLeft, coords, side = 'right' )
+    pointDepths = numOpenAtZero + numOpened - np.searchsorted( sortedRight, coords, side = 'left' )
+    gapDepths = numOpenAtZero + numOpened - np.searchsorted( sortedRight, coords, side = 'right' )
+    return coords, pointDepths, gapDepths
+
+# Function to find the pairs of sets in which one set is contained in the other
+#   left_endpts, right_endpts: arrays of N endpoints (a set wraps around when right_endpt <= left_endpt)
+#   findContainmentPairs: if False, only returns whether there is a containment (stops at the first one)
+# returns the list of index pairs (i, j) such that set i is contained in set j (identical sets are reported once)
+#
+# Sets whose endpoints coincide cover the whole circle: they contain every other set, and are identical to each
+# other, so they are handled directly.  Every other set becomes the interval [left, right] of the line, with
+# right + modulo for sets that wrap around.  A set that wraps around is also copied to [left - modulo, right], as
+# a container only: an arc is contained in another exactly when its interval is contained in one of the
+# intervals of the other.  Sorting the intervals by (left ascending, right
+# descending), the containers of an interval are the earlier intervals that end after it, found by bisection in
+# the sorted list of their right ends: O(N log N + K) for K pairs.
+def _containmentPairs( left_endpts, right_endpts, modulo, findContainmentPairs = True ):
+    left = np.asarray( left_endpts, dtype = float )
+    right = np.asarray( right_endpts, dtype = float )
+    full = np.flatnonzero( left == right )
+    if not findContainmentPairs and len( full ) > 0 and len( left ) > 1:
+      return True
+    
+    # pairs with a set covering the whole circle as the container (a later full set is contained in an earlier one)
+    others = np.flatnonzero( left != right )
+    pairs = [ (i, f) for f in full.tolist() for i in others.tolist() ]
+    pairs.extend( itertools.combinations( full.tolist()[::-1], 2 ) )
+    
+    left, right = left[others], right[others]
+    N = len( left )
+    wraps = right < left
+    ends = np.where( wraps, right + modulo, right )
+    copies = np.flatnonzero( wraps )
+    
+    starts = np.concatenate( (left, left[copies] - modulo) )
+    ends = np.concatenate( (ends, ends[copies] - modulo) )
+    owner = np.concatenate( (others, others[copies]) )
+    order = np.lexsort( (-ends, starts) )
+    
+    if not findContainmentPairs:
+      # an interval has a container when an earlier interval ends after it
+      sortedEnds = ends[order]
+      isReal = order < N
+      prevMaxEnds = np.maximum.accumulate( sortedEnds )[:-1]
+      return bool( np.any( (prevMaxEnds >= sortedEnds[1:]) & isReal[1:] ) )
+    
+    openEnds = [] # right ends of the intervals seen so far, sorted, with their sets
+    openSets = []
+    for item, ind, end in zip( order.tolist(), owner[order].tolist(), ends[order].tolist() ):
+      if item < N:
+        first = bisect.bisect_left( openEnds, end )
+        pairs.extend( (ind, j) for j in openSets[first:] if j != ind )
+      pos = bisect.bisect_right( openEnds, end )
+      openEnds.insert( pos, end )
+      openSets.insert( pos, ind )
+    return pairs
+
+# Function to replace endpoints by their ranks among the distinct endpoints of their own society
+#   left_endpts, right_endpts: (number of societies) x N arrays, one society per row (N >= 1)
+# returns leftRanks, rightRanks (integer arrays of the same shape), numDistinct (number of distinct endpoints
+#   in each society), distinctValues (the distinct endpoints of all societies, in order) and rowBase
+#   (position in distinctValues of the first distinct endpoint of each society)
+# Working with integer ranks keeps all comparisons exact once the circle is unrolled.
+def _rankEndpoints( left_endpts, right_endpts ):
+    nSoc, N = left_endpts.shape
+    values = np.concatenate( (left_endpts, right_endpts), axis = 1 ).ravel()
+    rows = np.repeat( np.arange(nSoc), 2*N )
+    order = np.lexsort( (values, rows) )
+    sortedValues = values[order]
+    
+    isNew = np.ones( len(values), dtype = bool )
+    isNew[1:] = sortedValues[1:] != sortedValues[:-1]
+    isNew[::2*N] = True # each society starts a new run of ranks
+    denseRanks = np.cumsum( isNew ) - 1
+    rowBase = denseRanks[::2*N]
+    
+    ranks = np.empty( len(values), dtype = np.int64 )
+    ranks[order] = denseRanks - np.repeat( rowBase, 2*N )
+    ranks = ranks.reshape( nSoc, 2*N )
+    numDistinct = np.append( rowBase[1:], denseRanks[-1] + 1 ) - rowBase
+    return ranks[:, :N], ranks[:, N:], numDistinct, sortedValues[isNew], rowBase
+
+# Function to count, for every starting set, the size of the greedy piercing set that starts at its right endpoint
+#   leftRanks, rightRanks, numDistinct: as returned by _rankEndpoints
+# returns counts ((number of societies) x N array) and nextPoint, the function that gives the next greedy point
+#
+# The circle of each society is unrolled into [0, 2K) (K distinct endpoints) with every set copied once per lap,
+#   and the societies are laid side by side on a single integer line.  Starting at a point x0, the greedy
+#   sweep jumps from x to the smallest right end among the sets that start after x, until it has gone once
+#   around the circle (x0 + K).  An optimal piercing set can always be moved to right endpoints, so the minimum
+#   over all starting sets is the piercing number.  The jumps are combined by binary lifting: O(N log N) overall.
+def _greedyPiercingCounts( leftRanks, rightRanks, numDistinct ):
+    nSoc, N = leftRanks.shape
+    K = numDistinct.reshape( -1, 1 )
+    stride = 6*N + 1 # unrolled coordinates of a society are < 3K <= 6N
+    offset = ( np.arange(nSoc) * stride ).reshape( -1, 1 )
+    sentinel = nSoc * stride
+    
+    starts = leftRanks + offset
+    ends = rightRanks + K * (rightRanks <= leftRanks) + offset
+    allStarts = np.concatenate( (starts, starts + K), axis = 1 ).ravel()
+    allEnds = np.concatenate( (ends, ends + K), axis = 1 ).ravel()
+    
+    order = np.argsort( allStarts, kind = 'stable' )
+    sortedStarts = allStarts[order]
+    suffixMinEnds = np.append( np.minimum.accumulate( allEnds[order][::-1] )[::-1], sentinel )
+    
+    def nextPoint( x ):
+        return suffixMinEnds[ np.searchsorted( sortedStarts, x, side = 'right' ) ]
+    
+    # Jump table over the points the sweep can land on (the right ends), with the sentinel as a fixed point
+    positions = np.append( np.unique( allEnds ), sentinel )
+    jumps = [ np.searchsorted( positions, nextPoint( positions ) ) ]
+    while 2**len(jumps) <= N:
+        jumps.append( jumps[-1][ jumps[-1] ] )
+    
+    x0 = ( rightRanks + offset ).ravel()
+    limit = x0 + np.repeat( numDistinct, N )
+    x1 = nextPoint( x0 )
+    hasSecond = x1 < limit
+    counts = 1 + hasSecond.astype( np.int64 )
+    current = np.searchsorted( positions, x1 )
+    for level in range( len(jumps) - 1, -1, -1 ):
+        candidate = jumps[level][current]
+        canJump = hasSecond & ( positions[candidate] < limit )
+        current = np.where( canJump, candidate, current )
+        counts += canJump.astype( np.int64 ) << level
+    
+    return counts.reshape( nSoc, N ), nextPoint
+
+# Function to find the piercing number and a piercing set of one society with the combinatorial algorithm
+#   left_endpts, right_endpts: arrays of N > 0 endpoints (a set wraps around when right_endpt <= left_endpt)
+# returns the piercing number and the sorted array of piercing points
+def _piercingSet( left_endpts, right_endpts ):
+    N = len( left_endpts )
+    with _phase( 'findPiercingNumber(combinatorial): ranking' ):
+        leftRanks, rightRanks, numDistinct, distinctValues, _ = _rankEndpoints( left_endpts.reshape(1, N), right_endpts.reshape(1, N) )
+    with _phase( 'findPiercingNumber(combinatorial): greedy counts' ):
+        counts, nextPoint = _greedyPiercingCounts( leftRanks, rightRanks, numDistinct )
+    
+    # Re-run the greedy sweep from the best starting set to recover its piercing points
+    K = numDistinct[0]
+    best = np.argmin( counts[0] )
+    points = [ rightRanks[0, best] ]
+    limit = points[0] + K
+    while True:
+        x = nextPoint( points[-1] )
+        if x >= limit:
+            break
+        points.append( x )
+    
+    piercingNumber = int( counts[0, best] )
+    piercingSet = np.sort( distinctValues[ np.array(points) % K ] )
+    return piercingNumber, piercingSet
+
+# Function to find the candidate piercing points used by the ILP formulation of the piercing number
+#   Any piercing point can be moved forward to the next right endpoint (every set containing it contains that right
+#   endpoint), and a right endpoint at which no set starts since the previous right endpoint pierces no set that the
+#   previous one does not pierce.  So the candidates are, for each left endpoint, the next right endpoint.
+# returns the sorted array of candidates
+def _piercingCandidates( left_endpts, right_endpts ):
+    rights = np.unique( right_endpts )
+    if len( rights ) == 0:
+        return rights
+    return rights[ np.unique( np.searchsorted( rights, left_endpts ) % len( rights ) ) ]
+
+# Function to build the sparse (number of sets) x (number of candidates) matrix whose entry [i, j] is 1 when the
+#   j-th candidate is in the i-th set.  The candidates in a set are one cyclic run of the sorted candidates (two
+#   ranges of indices if the set wraps around), so the entries are generated directly, in vectorized form.
+def _piercingConstraintMatrix( left_endpts, right_endpts, candidates, sparse ):
+    N, K = len( left_endpts ), len( candidates )
+    starts = np.searchsorted( candidates, left_endpts, side = 'left' )
+    ends = np.searchsorted( candidates, right_endpts, side = 'right' )
+    wraps = right_endpts < left_endpts
+    isFull = right_endpts == left_endpts
+    
+    # range 1: [start, end), or [start, K) for sets that wrap around; range 2: [0, end) for sets that wrap around
+    rangeStarts = np.concatenate( ( np.where( isFull, 0, starts ), np.zeros( np.sum(wraps), dtype = np.int64 ) ) )
+    rangeEnds = np.concatenate( ( np.where( wraps | isFull, K, ends ), ends[wraps] ) )
+    rangeSets = np.concatenate( ( np.arange( N ), np.flatnonzero( wraps ) ) )
+    lengths = np.maximum( rangeEnds - rangeStarts, 0 )
+    
+    rows = np.repeat( rangeSets, lengths )
+    cols = np.arange( np.sum( lengths ) ) - np.repeat( np.cumsum( lengths ) - lengths - rangeStarts, lengths )
+    return sparse.csr_matrix( ( np.ones( len(rows) ), (rows, cols) ), shape = (N, K) )
+
+# Function to find a largest subcollection of sets in which no point lies in more than maxDepth sets
+#   left_endpts, right_endpts: arrays of N endpoints
+# returns the (sorted) indices of the selected sets
+#
+# The number of sets containing a point is largest at left endpoints, so only the distinct left endpoints are
+#   constrained.  Each set covers a cyclically consecutive run of these points, which makes the problem
+#     maximize sum(x)  subject to  A x <= maxDepth,  0 <= x <= 1
+#   a linear program with a circular-ones matrix A.  Fixing sum(x) to an integer t turns it into a network
+#   problem (Bartholdi, Orlin and Ratliff, 1980), so the largest integer t below the LP optimum is attained by an
+#   integral vertex, which the simplex method returns.
+@_instrumented
+def _largestSubcollectionBelowDepth( left_endpts, right_endpts, maxDepth ):
+    N = len( left_endpts )
+    if maxDepth <= 0 or N == 0:
+        return np.arange( 0 )
+    
+    sparse = _importOptional( 'scipy.sparse', "checkAgreeability( )" )
+    optimize = _importOptional( 'scipy.optimize', "checkAgreeability( )" )
+    with _phase( 'checkAgreeability: matrix build' ):
+        A = sparse.csr_matrix( pointsInSets( np.unique( left_endpts ), left_endpts, right_endpts ).astype( float ) )
+    bounds = ( 0, 1 )
+    with _phase( 'checkAgreeability: solve' ):
+        relaxed = optimize.linprog( -np.ones(N), A_ub = A, b_ub = np.full( A.shape[0], maxDepth ), bounds = bounds, method = 'highs' )
+        _recordSolverStatus( 'HiGHS', relaxed.status )
+        size = int( np.floor( -relaxed.fun + 1e-9 ) )
+        
+        result = optimize.linprog( np.zeros(N), A_ub = A, b_ub = np.full( A.shape[0], maxDepth ),
+                                   A_eq = np.ones( (1, N) ), b_eq = [size], bounds = bounds, method = 'highs-ds' )
+        _recordSolverStatus( 'HiGHS (dual simplex)', result.status )
+        x = result.x
+        if np.any( np.abs( x - np.round(x) ) > 1e-6 ):
+            # safeguard against a non-vertex solution from the LP solver: solve the integer program directly
+            result = optimize.milp( np.zeros(N), integrality = np.ones(N),
+                                    constraints = [ optimize.LinearConstraint( A, -np.inf, maxDepth ),
+                                                    optimize.LinearConstraint( np.ones( (1, N) ), size, size ) ],
+                                    bounds = optimize.Bounds( 0, 1 ) )
+            _recordSolverStatus( 'HiGHS (MILP)', result.status )
+            x = result.x
+    return np.flatnonzero( np.round( x ) > 0 )
 
 # Part 3 - generating random circular societies ----------------------------------    
 
 # Define function to generate a random fixed-length circular society
+@_instrumented
 def generateRandomFixedLengthSociety( societyname, N, modulo, p, tick = 0.5 ):
     # N is number of voters
     # modulo is the circumference of the circular society
@@ -497,15 +1518,15 @@ def generateRandomFixedLengthSociety( societyname, N, modulo, p, tick = 0.5 ):
     
     CS = CircularSociety( societyname, modulo, tick = tick )
     
-    for i in list(range(N)):
-      left = np.random.uniform(low=0, high=modulo)
-      right = (left + p * modulo) % modulo
-      CS.addApprovalSet( "Set " + str(i+1), left , right )
+    left = np.random.uniform(low=0, high=modulo, size=N)
+    right = (left + p * modulo) % modulo
+    CS.addApprovalSets( [ "Set " + str(i+1) for i in range(N) ], left, right )
     
     return CS
 
 # extras:
 # Define function to generate a circular society with a random approval sets
+@_instrumented
 def generateRandomSociety( societyname, N, modulo, epsilon = 0.5, mode = 1, a = 1, b = 1 ):
     # epsilon = 0.5 is the perturbation of the right-endpoints
     # N is number of voters
@@ -516,26 +1537,929 @@ def generateRandomSociety( societyname, N, modulo, epsilon = 0.5, mode = 1, a =
     
     CS = CircularSociety( societyname, modulo, tick = epsilon )
     
-    for i in list(range(N)):
-      if mode == 1:
-        left = np.random.uniform(low=0, high=modulo)
-        right = np.random.uniform(low=0, high=modulo)
-      elif mode == 2:
-        left = np.random.uniform(low=0, high=modulo) 
-        right = (left + np.random.beta(a, b)* modulo) % modulo
+    if mode == 1:
+      endpts = np.random.uniform(low=0, high=modulo, size=(N, 2)) # drawn in the same order as one set at a time
+      left = endpts[:, 0]
+      right = endpts[:, 1]
+    elif mode == 2:
+      left = np.zeros(N)
+      right = np.zeros(N)
+      for i in list(range(N)):
+        left[i] = np.random.uniform(low=0, high=modulo) 
+        right[i] = (left[i] + np.random.beta(a, b)* modulo) % modulo
         
-      CS.addApprovalSet( "Set " + str(i+1), left , right )
+    CS.addApprovalSets( [ "Set " + str(i+1) for i in range(N) ], left, right )
     
     
     return CS
   
 # Define function to generate U(N, h) (Hardin's uniform circular society)
+@_instrumented
 def generateUniformCircularSociety( societyname, N, h, epsilon = 0.5 ):
     # epsilon = 0.5 is the perturbation of the right-endpoints
     
     CS = CircularSociety( societyname, N, tick = epsilon )
     
-    for i in list(range(N)):
-        CS.addApprovalSet( "Set " + str(i+1), i, round( (i + h - epsilon) % N, 1) )
+    CS.addApprovalSets( [ "Set " + str(i+1) for i in range(N) ], list(range(N)), [ round( (i + h - epsilon) % N, 1) for i in range(N) ] )
+    return CS
+
+# Define function to create a circular society directly from arrays of endpoints
+#   setNames: (Optional) list of set names; the default is "Set 1", "Set 2", ...
+@_instrumented
+def generateSocietyFromEndpoints( societyname, modulo, left_endpts, right_endpts, setNames = None, tick = 0.5 ):
+    CS = CircularSociety( societyname, modulo, tick = tick )
+    if setNames is None:
+        setNames = [ "Set " + str(i+1) for i in range( len(left_endpts) ) ]
+    CS.addApprovalSets( setNames, left_endpts, right_endpts )
     return CS
 
+# Define function to create a circular society from an iterable of (setName, left_endpt, right_endpt) tuples
+def generateSocietyFromTuples( societyname, modulo, approvalSets, tick = 0.5 ):
+    approvalSets = list( approvalSets )
+    setNames = [ A[0] for A in approvalSets ]
+    left_endpts = [ A[1] for A in approvalSets ]
+    right_endpts = [ A[2] for A in approvalSets ]
+    return generateSocietyFromEndpoints( societyname, modulo, left_endpts, right_endpts, setNames = setNames, tick = tick )
+
+# Part 4 - ensembles of random circular societies (Monte Carlo) ----------------------------------
+# An ensemble of nSoc societies with N voters each is stored as two nSoc x N arrays of left and right endpoints
+#   (one society per row), so that whole ensembles can be generated and analyzed without building
+#   CircularSociety objects.  rng can be None, a seed, or a numpy random Generator.
+
+# Define function to generate an ensemble of random fixed-length circular societies
+#   (same distribution as generateRandomFixedLengthSociety)
+def generateRandomFixedLengthEnsemble( nSoc, N, modulo, p, rng = None ):
+    rng = np.random.default_rng( rng )
+    left = rng.uniform( low = 0, high = modulo, size = (nSoc, N) )
+    right = (left + p * modulo) % modulo
+    return left, right
+
+# Define function to generate an ensemble of random circular societies
+#   (same distribution as generateRandomSociety)
+#   mode = 1: endpoints are chosen uniformly at random from [0, modulo]
+#   mode = 2: left endpoint is chosen uniformly at random from [0, modulo];
+#             set length is from the beta distribution with parameters a, b
+def generateRandomEnsemble( nSoc, N, modulo, mode = 1, a = 1, b = 1, rng = None ):
+    rng = np.random.default_rng( rng )
+    left = rng.uniform( low = 0, high = modulo, size = (nSoc, N) )
+    if mode == 1:
+        right = rng.uniform( low = 0, high = modulo, size = (nSoc, N) )
+    elif mode == 2:
+        right = (left + rng.beta( a, b, size = (nSoc, N) ) * modulo) % modulo
+    else:
+        raise ValueError( "mode must be 1 or 2" )
+    return left, right
+
+# Function to compute the agreement number of every society of an ensemble
+#   Each row is swept once: its endpoints are sorted (left endpoints before right endpoints at ties, since
+#   endpoints are closed) and the running count of open sets is accumulated, starting from the number of
+#   sets that wrap around.  Sets whose endpoints coincide cover the whole circle and only count as wrapping.
+@_instrumented
+def ensembleAgreementNumbers( left_endpts, right_endpts ):
+    left = np.asarray( left_endpts, dtype = float )
+    right = np.asarray( right_endpts, dtype = float )
+    nSoc, N = left.shape
+    if N == 0:
+        return np.zeros( nSoc, dtype = np.int64 )
+    
+    numOpenAtZero = np.sum( right <= left, axis = 1 )
+    isOpening = ( left != right ).astype( np.int64 )
+    values = np.concatenate( (left, right), axis = 1 )
+    steps = np.concatenate( (isOpening, -isOpening), axis = 1 )
+    isRight = np.broadcast_to( np.repeat( [0, 1], N ), values.shape )
+    order = np.lexsort( (isRight, values), axis = 1 )
+    depths = np.cumsum( np.take_along_axis( steps, order, axis = 1 ), axis = 1 )
+    return numOpenAtZero + np.maximum( depths.max( axis = 1 ), 0 )
+
+# Function to compute the piercing number of every society of an ensemble (exact; see _greedyPiercingCounts)
+#   batchSize: number of societies processed at once (bounds the memory used)
+@_instrumented
+def ensemblePiercingNumbers( left_endpts, right_endpts, batchSize = 10000 ):
+    left = np.asarray( left_endpts, dtype = float )
+    right = np.asarray( right_endpts, dtype = float )
+    nSoc, N = left.shape
+    piercingNumbers = np.zeros( nSoc, dtype = np.int64 )
+    if N == 0:
+        return piercingNumbers
+    
+    for start in range( 0, nSoc, batchSize ):
+        stop = min( start + batchSize, nSoc )
+        leftRanks, rightRanks, numDistinct, _, _ = _rankEndpoints( left[start:stop], right[start:stop] )
+        counts, _ = _greedyPiercingCounts( leftRanks, rightRanks, numDistinct )
+        piercingNumbers[start:stop] = counts.min( axis = 1 )
+    return piercingNumbers
+
+# Function to estimate the distributions of the piercing and agreement numbers of random circular societies
+#   N: number of approval sets;  nSoc: number of randomly-generated societies
+#   p: if given, every set has length p * modulo (as in generateRandomFixedLengthSociety);
+#      otherwise set lengths are modulo * beta(a, b) (as in generateRandomSociety, mode = 2)
+# returns piercingProbs, agreementProbs (entry i is the fraction of societies whose piercing/agreement number is i,
+#   for i = 0, ..., N), and the lists of piercing and agreement numbers of all societies
+@_instrumented
+def computeEnsembleDistributions( N, nSoc, modulo = 1, p = None, a = 1, b = 1, batchSize = 10000, rng = None ):
+    rng = np.random.default_rng( rng )
+    piercingNumList = np.zeros( nSoc, dtype = np.int64 )
+    agreementNumList = np.zeros( nSoc, dtype = np.int64 )
+    
+    for start in range( 0, nSoc, batchSize ):
+        stop = min( start + batchSize, nSoc )
+        if p is None:
+            left, right = generateRandomEnsemble( stop - start, N, modulo, mode = 2, a = a, b = b, rng = rng )
+        else:
+            left, right = generateRandomFixedLengthEnsemble( stop - start, N, modulo, p, rng = rng )
+        piercingNumList[start:stop] = ensemblePiercingNumbers( left, right, batchSize = batchSize )
+        agreementNumList[start:stop] = ensembleAgreementNumbers( left, right )
+    
+    piercingProbs = np.bincount( piercingNumList, minlength = N+1 ) / nSoc
+    agreementProbs = np.bincount( agreementNumList, minlength = N+1 ) / nSoc
+    return piercingProbs, agreementProbs, piercingNumList, agreementNumList
+
+# Function to approximate the probability of various piercing numbers of random fixed-length societies
+#   N: number of approval sets;  p: length of the approval sets (as a fraction of modulo)
+#   nSoc: number of randomly-generated societies;  maxTau: max piercing number to approximate the probability of
+# returns array of probabilites for tau in 1, 2, ..., maxTau, and the list of piercing numbers of all societies
+def computePiercingProbabilities( N, p, nSoc, maxTau, modulo = 1, batchSize = 10000, rng = None ):
+    piercingProbs, _, piercingNumList, _ = computeEnsembleDistributions( N, nSoc, modulo = modulo, p = p,
+                                                                        batchSize = batchSize, rng = rng )
+    probs = np.zeros( maxTau )
+    numTau = min( maxTau, N )
+    probs[:numTau] = piercingProbs[1:numTau+1]
+    return probs, piercingNumList
+
+# Function to estimate the probability of various piercing numbers of random fixed-length societies, sampling
+#   batches of societies until every probability is known to the requested precision
+#   N: number of approval sets;  p: length of the approval sets (as a fraction of modulo)
+#   maxTau: max piercing number to estimate the probability of
+#   ciWidth: required width of the confidence interval of every probability (None: no requirement; if relError is
+#            not given either, the width is 0.01)
+#   relError: (Optional) required relative error of every sampled probability (half-width of the confidence
+#             interval divided by the estimate), which is the meaningful precision for rare piercing numbers
+#   zeroBound: with relError, a piercing number that is never sampled has no relative error; its probability is
+#              known precisely enough once the upper bound of its confidence interval is at most zeroBound
+#   confidence: confidence level of the intervals (Wilson score intervals)
+#   maxSamples: max number of sampled societies (sampling stops there even if the precision is not reached)
+# returns arrays of estimates, lower and upper confidence bounds for tau in 1, 2, ..., maxTau, the number of sampled
+#   societies, and whether the requested precision was reached.  Piercing numbers above N have probability 0.
+@_instrumented
+def estimatePiercingProbabilities( N, p, maxTau, ciWidth = None, relError = None, zeroBound = 1e-4, confidence = 0.95,
+                                   modulo = 1, batchSize = 10000, maxSamples = 10**7, rng = None ):
+    if ciWidth is None and relError is None:
+        ciWidth = 0.01
+    rng = np.random.default_rng( rng )
+    z = statistics.NormalDist().inv_cdf( 1 - (1 - confidence) / 2 )
+    numTau = min( maxTau, N )
+    counts = np.zeros( maxTau, dtype = np.int64 )
+    nSamples = 0
+    
+    while True:
+        nBatch = min( batchSize, maxSamples - nSamples )
+        left, right = generateRandomFixedLengthEnsemble( nBatch, N, modulo, p, rng = rng )
+        piercingNums = ensemblePiercingNumbers( left, right, batchSize = batchSize )
+        counts[:numTau] += np.bincount( piercingNums, minlength = N+1 )[1:numTau+1]
+        nSamples += nBatch
+        
+        # Wilson score intervals
+        probs = counts / nSamples
+        center = ( counts + z**2 / 2 ) / ( nSamples + z**2 )
+        halfWidth = z / ( nSamples + z**2 ) * np.sqrt( counts * (nSamples - counts) / nSamples + z**2 / 4 )
+        lower = np.maximum( center - halfWidth, 0 )
+        upper = np.minimum( center + halfWidth, 1 )
+        lower[numTau:] = upper[numTau:] = 0
+        
+        precise = np.ones( numTau, dtype = bool )
+        if ciWidth is not None:
+            precise &= ( upper - lower )[:numTau] <= ciWidth
+        if relError is not None:
+            isSampled = counts[:numTau] > 0
+            precise &= np.where( isSampled, halfWidth[:numTau] <= relError * probs[:numTau], upper[:numTau] <= zeroBound )
+        converged = bool( np.all( precise ) )
+        if converged or nSamples >= maxSamples:
+            return probs, lower, upper, nSamples, converged
+
+# Part 5 - parameter sweeps over (n, p) ----------------------------------
+# A sweep estimates the piercing- and agreement-number distributions of random fixed-length societies for every
+#   cell (n, p) of the grid nvals x pvals.  Each finished cell is written to its own file in resultsDir, so an
+#   interrupted sweep can be restarted and only the missing cells are computed.  Every cell has its own random
+#   stream, spawned from a single seed (stored in resultsDir/sweep.json), so results do not depend on which
+#   worker computes a cell or in which order.
+
+# Function to run (or resume) a parameter sweep, sharding the cells across a pool of numWorkers processes
+#   nvals: numbers of approval sets;  pvals: lengths of the approval sets (as a fraction of modulo)
+#   nSoc: number of randomly-generated societies per cell
+#   seed: seed of the sweep (ignored when resuming; the stored seed is used)
+#   numWorkers: number of worker processes (default: number of CPUs; 1 runs everything in this process)
+# returns the results of the sweep (see loadParameterSweep)
+def runParameterSweep( nvals, pvals, nSoc, resultsDir, modulo = 1, seed = None, numWorkers = None, batchSize = 10000 ):
+    nvals = [ int(n) for n in nvals ]
+    pvals = [ float(p) for p in pvals ]
+    settings = { 'nvals': nvals, 'pvals': pvals, 'nSoc': int(nSoc), 'modulo': modulo }
+    
+    os.makedirs( resultsDir, exist_ok = True )
+    manifestFile = os.path.join( resultsDir, 'sweep.json' )
+    if os.path.exists( manifestFile ):
+        with open( manifestFile ) as f:
+            manifest = json.load( f )
+        for key, value in settings.items():
+            if manifest[key] != value:
+                raise ValueError( "resultsDir contains a sweep with a different '" + key + "'; use a new directory" )
+    else:
+        manifest = dict( settings, entropy = str( np.random.SeedSequence( seed ).entropy ) )
+        with open( manifestFile, 'w' ) as f:
+            json.dump( manifest, f )
+    
+    cellSeeds = np.random.SeedSequence( int( manifest['entropy'] ) ).spawn( len(nvals) * len(pvals) )
+    pending = []
+    for i, n in enumerate( nvals ):
+        for j, p in enumerate( pvals ):
+            if not os.path.exists( _sweepCellFile( resultsDir, i, j ) ):
+                pending.append( ( resultsDir, i, j, n, p, nSoc, modulo, cellSeeds[ i*len(pvals) + j ], batchSize ) )
+    
+    if numWorkers == 1:
+        for cell in pending:
+            _runSweepCell( *cell )
+    elif len( pending ) > 0:
+        # if instrumentation is enabled, the statistics of the workers are added to those of this process
+        stats = _stats
+        with concurrent.futures.ProcessPoolExecutor( max_workers = numWorkers ) as pool:
+            futures = [ pool.submit( _runSweepCell, *cell, collectStats = stats is not None ) for cell in pending ]
+            for future in concurrent.futures.as_completed( futures ):
+                workerStats = future.result() # re-raise any error from the workers
+                if stats is not None:
+                    stats.merge( workerStats )
+    
+    return loadParameterSweep( resultsDir )
+
+# Function to load the results of a (possibly unfinished) parameter sweep
+# returns a dictionary with entries
+#   'nvals', 'pvals', 'nSoc': the settings of the sweep
+#   'completed': boolean array, completed[i, j] is True when the cell (nvals[i], pvals[j]) is finished
+#   'piercingHistograms', 'agreementHistograms': entry [i, j, k] is the number of societies in cell (i, j)
+#       with piercing/agreement number k (k = 0, ..., max(nvals))
+#   'piercingMeans', 'piercingVariances', 'agreementMeans', 'agreementVariances': moments for each cell
+#       (NaN for unfinished cells)
+def loadParameterSweep( resultsDir ):
+    with open( os.path.join( resultsDir, 'sweep.json' ) ) as f:
+        manifest = json.load( f )
+    nvals = manifest['nvals']
+    pvals = manifest['pvals']
+    shape = ( len(nvals), len(pvals) )
+    
+    results = { 'nvals': np.array( nvals ), 'pvals': np.array( pvals ), 'nSoc': manifest['nSoc'],
+                'completed': np.zeros( shape, dtype = bool ),
+                'piercingHistograms': np.zeros( shape + ( max(nvals) + 1, ), dtype = np.int64 ),
+                'agreementHistograms': np.zeros( shape + ( max(nvals) + 1, ), dtype = np.int64 ) }
+    for key in [ 'piercingMeans', 'piercingVariances', 'agreementMeans', 'agreementVariances' ]:
+        results[key] = np.full( shape, np.nan )
+    
+    for i, n in enumerate( nvals ):
+        for j, p in enumerate( pvals ):
+            cellFile = _sweepCellFile( resultsDir, i, j )
+            if not os.path.exists( cellFile ):
+                continue
+            with np.load( cellFile ) as cell:
+                results['completed'][i, j] = True
+                results['piercingHistograms'][i, j, :n+1] = cell['piercingHistogram']
+                results['agreementHistograms'][i, j, :n+1] = cell['agreementHistogram']
+                for key in [ 'piercingMean', 'piercingVariance', 'agreementMean', 'agreementVariance' ]:
+                    results[key + 's'][i, j] = cell[key]
+    return results
+
+def _sweepCellFile( resultsDir, i, j ):
+    return os.path.join( resultsDir, 'cell_' + str(i) + '_' + str(j) + '.npz' )
+
+# Function to compute one cell of a parameter sweep and write it to its file
+#   (runs in a worker process; the file is written under a temporary name and then renamed, so that an
+#    interrupted worker never leaves a partial cell behind)
+def _runSweepCell( resultsDir, i, j, n, p, nSoc, modulo, seedSequence, batchSize, collectStats = False ):
+    if collectStats:
+        enableInstrumentation()
+    _, _, piercingNumList, agreementNumList = computeEnsembleDistributions( n, nSoc, modulo = modulo, p = p,
+                                                                           batchSize = batchSize, rng = seedSequence )
+    cellFile = _sweepCellFile( resultsDir, i, j )
+    tempFile = cellFile + '.' + str( os.getpid() ) + '.tmp'
+    with open( tempFile, 'wb' ) as f:
+        np.savez( f, n = n, p = p, nSoc = nSoc,
+                  piercingHistogram = np.bincount( piercingNumList, minlength = n+1 ),
+                  agreementHistogram = np.bincount( agreementNumList, minlength = n+1 ),
+                  piercingMean = np.mean( piercingNumList ), piercingVariance = np.var( piercingNumList ),
+                  agreementMean = np.mean( agreementNumList ), agreementVariance = np.var( agreementNumList ) )
+    os.replace( tempFile, cellFile )
+    if collectStats:
+        return disableInstrumentation().asDict()
+
+
+# Part 6 - storing societies and ensembles ----------------------------------
+# Societies and ensembles are stored column by column in a single binary file:
+#   the magic bytes b'CIRCSOC1', the length of the header (8 bytes, little-endian), the header (JSON: settings,
+#   stored results, and the dtype, shape and offset of every column), and then the columns, as raw arrays starting
+#   at multiples of 64 bytes.  The columns can therefore be memory-mapped, so that an ensemble of millions of
+#   societies can be read a few rows at a time without being loaded into memory.
+_STORAGE_MAGIC = b'CIRCSOC1'
+_STORAGE_ALIGNMENT = 64
+
+# Function to load a society saved with CircularSociety.save
+#   loadResults: if True, also returns the dictionary of stored results (empty if none were stored)
+def loadSociety( filename, loadResults = False ):
+    header, columns = _readColumns( filename, mmap = False )
+    if header.get( 'kind' ) != 'society':
+        raise ValueError( filename + " does not contain a circular society" )
+    
+    names = columns['names'].tobytes()
+    offsets = columns['nameOffsets'].tolist()
+    setNames = [ names[offsets[i]:offsets[i+1]].decode( 'utf-8' ) for i in range( len(offsets) - 1 ) ]
+    CS = generateSocietyFromEndpoints( header['name'], header['modulo'], columns['left_endpts'].tolist(),
+                                       columns['right_endpts'].tolist(), setNames = setNames, tick = header['tick'] )
+    if loadResults:
+        return CS, header.get( 'results', {} )
+    return CS
+
+# Function to save an ensemble (nSoc x N arrays of left and right endpoints, one society per row; see Part 4)
+#   results: (Optional) dictionary of arrays with one entry per society (e.g. {'piercingNumbers': ...})
+def saveEnsemble( filename, left_endpts, right_endpts, modulo, results = None ):
+    columns = { 'left_endpts': np.asarray( left_endpts, dtype = float ),
+                'right_endpts': np.asarray( right_endpts, dtype = float ) }
+    if columns['left_endpts'].ndim != 2 or columns['left_endpts'].shape != columns['right_endpts'].shape:
+        raise ValueError( "left_endpts and right_endpts must be nSoc x N arrays of the same shape" )
+    
+    resultNames = []
+    for key, values in ( results or {} ).items():
+        values = np.asarray( values )
+        if len( values ) != len( columns['left_endpts'] ):
+            raise ValueError( "Result '" + key + "' must have one entry per society" )
+        columns['results/' + key] = values
+        resultNames.append( key )
+    header = { 'kind': 'ensemble', 'modulo': modulo, 'results': resultNames }
+    _writeColumns( filename, header, columns )
+
+# Function to load an ensemble saved with saveEnsemble
+#   mmap: if True, the arrays are memory-mapped (read-only) instead of read into memory
+# returns left_endpts, right_endpts, modulo, and the dictionary of stored results
+def loadEnsemble( filename, mmap = True ):
+    header, columns = _readColumns( filename, mmap = mmap )
+    if header.get( 'kind' ) != 'ensemble':
+        raise ValueError( filename + " does not contain an ensemble" )
+    results = { key: columns['results/' + key] for key in header['results'] }
+    return columns['left_endpts'], columns['right_endpts'], header['modulo'], results
+
+# Function to write a header and named arrays in the storage format
+def _writeColumns( filename, header, columns ):
+    header = dict( header )
+    header['columns'] = {}
+    offset = 0
+    for key, values in columns.items():
+        values = np.ascontiguousarray( values )
+        header['columns'][key] = { 'dtype': values.dtype.newbyteorder( '<' ).str, 'shape': list( values.shape ), 'offset': offset }
+        offset += -( -values.nbytes // _STORAGE_ALIGNMENT ) * _STORAGE_ALIGNMENT
+    
+    # columns are stored after the header, from the first multiple of the alignment
+    headerBytes = json.dumps( header ).encode( 'utf-8' )
+    start = -( -( len(_STORAGE_MAGIC) + 8 + len(headerBytes) ) // _STORAGE_ALIGNMENT ) * _STORAGE_ALIGNMENT
+    headerBytes += b' ' * ( start - len(_STORAGE_MAGIC) - 8 - len(headerBytes) )
+    with open( filename, 'wb' ) as f:
+        f.write( _STORAGE_MAGIC + struct.pack( '<Q', len(headerBytes) ) + headerBytes )
+        for key, values in columns.items():
+            info = header['columns'][key]
+            f.seek( start + info['offset'] )
+            f.write( np.ascontiguousarray( values, dtype = info['dtype'] ).tobytes() )
+        f.truncate( start + offset )
+
+# Function to read the header and the arrays of a file in the storage format
+def _readColumns( filename, mmap = True ):
+    with open( filename, 'rb' ) as f:
+        if f.read( len(_STORAGE_MAGIC) ) != _STORAGE_MAGIC:
+            raise ValueError( filename + " is not a circular society file" )
+        headerLength, = struct.unpack( '<Q', f.read( 8 ) )
+        header = json.loads( f.read( headerLength ).decode( 'utf-8' ) )
+        start = f.tell()
+        
+        columns = {}
+        for key, info in header['columns'].items():
+            dtype = np.dtype( info['dtype'] )
+            shape = tuple( info['shape'] )
+            if mmap and np.prod( shape ) > 0:
+                columns[key] = np.memmap( filename, dtype = dtype, mode = 'r', offset = start + info['offset'], shape = shape )
+            else:
+                f.seek( start + info['offset'] )
+                count = int( np.prod( shape ) )
+                columns[key] = np.frombuffer( f.read( count * dtype.itemsize ), dtype = dtype, count = count ).reshape( shape )
+    return header, columns
+
+# Part 7 - result cache ----------------------------------
+# Agreement numbers and piercing numbers only depend on the combinatorial type of a society (its canonical form,
+#   see CircularSociety.getCanonicalForm).  When the result cache is enabled, these results are stored under the
+#   canonical form and shared by all societies of the same type.  This only pays off for societies with few sets
+#   (about 10 or fewer), where most sampled societies of a Monte Carlo run repeat an earlier type (99% of them for
+#   5 sets); the number of types grows so fast with the number of sets that with 15 sets almost no society repeats
+#   one, and computing the canonical form makes each result about twice as slow.  So only societies with at most
+#   maxSets sets use the cache.  Results are stored with endpoints given by positions in the canonical order,
+#   and translated to the endpoints of each society.  A cached piercing set is the one found for the first society
+#   of its type: it pierces the society and has the right size, but it may differ from the piercing set that would
+#   be computed without the cache.  (LR-alternation is not cached: checking it directly is cheaper than computing
+#   the canonical form.)  The least recently used results are evicted when the cache is full.  Since the canonical
+#   form is recomputed whenever a society changes, results never have to be invalidated.
+_resultCache = None
+
+class _ResultCache:
+    def __init__( self, maxSize, filename, maxSets ):
+        self.maxSize = maxSize
+        self.maxSets = maxSets
+        self.filename = filename
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    
+    def get( self, key, compute ):
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end( key )
+            return self.entries[key]
+        self.misses += 1
+        value = compute()
+        self.entries[key] = value
+        while len( self.entries ) > self.maxSize:
+            self.entries.popitem( last = False )
+        return value
+
+# Function to enable the result cache
+#   maxSize: max number of stored results
+#   filename: (Optional) file the cache is saved to by saveResultCache; if it exists, the stored results are loaded
+#   maxSets: max number of sets of the societies that use the cache (larger societies rarely repeat a type)
+def enableResultCache( maxSize = 100000, filename = None, maxSets = 10 ):
+    global _resultCache
+    _resultCache = _ResultCache( maxSize, filename, maxSets )
+    if filename is not None and os.path.exists( filename ):
+        with open( filename, 'rb' ) as f:
+            entries = pickle.load( f )
+        for key, value in entries[ -maxSize: ]:
+            _resultCache.entries[key] = value
+
+# Function to disable (and empty) the result cache
+def disableResultCache():
+    global _resultCache
+    _resultCache = None
+
+# Function to save the result cache to a file (the file given to enableResultCache by default)
+def saveResultCache( filename = None ):
+    if _resultCache is None:
+        raise RuntimeError( "The result cache is not enabled" )
+    if filename is None:
+        filename = _resultCache.filename
+    if filename is None:
+        raise ValueError( "No file given for the result cache" )
+    tempFile = filename + '.' + str( os.getpid() ) + '.tmp'
+    with open( tempFile, 'wb' ) as f:
+        pickle.dump( list( _resultCache.entries.items() ), f )
+    os.replace( tempFile, filename )
+
+# Function to obtain the statistics of the result cache: numbers of hits and misses, number of stored results
+def resultCacheInfo():
+    if _resultCache is None:
+        return { 'enabled': False, 'hits': 0, 'misses': 0, 'size': 0, 'maxSize': 0, 'maxSets': 0 }
+    return { 'enabled': True, 'hits': _resultCache.hits, 'misses': _resultCache.misses,
+             'size': len( _resultCache.entries ), 'maxSize': _resultCache.maxSize, 'maxSets': _resultCache.maxSets }
+
+# Function to find the least rotation of a sequence (Booth's algorithm, O(n))
+# returns k such that seq[k:] + seq[:k] is the lexicographically least rotation of seq
+def _leastRotation( seq ):
+    n = len( seq )
+    doubled = seq + seq
+    failure = [ -1 ] * ( 2*n )
+    k = 0
+    for j in range( 1, 2*n ):
+        c = doubled[j]
+        i = failure[ j - k - 1 ]
+        while i != -1 and c != doubled[ k + i + 1 ]:
+            if c < doubled[ k + i + 1 ]:
+                k = j - i - 1
+            i = failure[i]
+        if c != doubled[ k + i + 1 ]: # here i == -1
+            if c < doubled[k]:
+                k = j
+            failure[ j - k ] = -1
+        else:
+            failure[ j - k ] = i + 1
+    return k
+
+
+# Part 8 - product societies ----------------------------------
+# A product society has approval sets that are products of one set per axis (e.g. on the cylinder circle x line, or
+#   on the torus circle x circle).  On a circle axis (given by its modulo), the set of an approval set follows the
+#   semantics of the Set class: it is the arc from left_endpt to right_endpt, wrapping around when
+#   right_endpt <= left_endpt (the whole circle if they are equal).  On a line axis (modulo None), it is the interval
+#   [left_endpt, right_endpt], with left_endpt <= right_endpt.  A point is in an approval set when each of its
+#   coordinates is in the set of that axis.
+
+# Define the ProductSociety class
+class ProductSociety:
+    
+    # Initialize Class
+    #   moduli: one entry per axis, the modulo of a circle axis or None for a line axis
+    def __init__( self, name, moduli, tick = 0.5 ):
+        self.name = name
+        self.moduli = list( moduli )
+        self.dimension = len( self.moduli )
+        self.numVoters = 0
+        self.tick = tick
+        
+        # Names and endpoints of the sets (the endpoints of a set are tuples, with one entry per axis)
+        self.list_setnames = []
+        self.list_left_endpts = []
+        self.list_right_endpts = []
+        self._setIndex = {}
+        
+        # Version counter and cached results (as in CircularSociety)
+        self.version = 0
+        self._cache = {}
+    
+    ### DISPLAYING / OBTAINING BASIC INFORMATION ABOUT THE PRODUCT SOCIETY----
+    
+    # Method to print list of approval sets
+    def listApprovalSets( self ):
+        for setName, left, right in zip( self.list_setnames, self.list_left_endpts, self.list_right_endpts ):
+            print( " " + setName + ": " + " x ".join( _axisSetString( l, r, modulo ) for l, r, modulo in zip( left, right, self.moduli ) ) )
+    
+    # Method to print society information
+    def printSocietyInfo( self ):
+        print("Product Society Name: " + self.name)
+        print("Spectrum: " + " x ".join( "line" if modulo is None else "[0, " + str(modulo) + "]" for modulo in self.moduli ) + ".  (Note: on circle axes, we identify 0 = modulo)" )
+        print("Number of Voters: " + str(self.numVoters) )
+        print("Approval Sets:")
+        self.listApprovalSets()
+    
+    # Method to return a cached result computed by compute(), recomputing it if the society changed since
+    def _cached( self, key, compute ):
+        version, value = self._cache.get( key, (None, None) )
+        if version != self.version:
+            value = compute()
+            self._cache[key] = ( self.version, value )
+        return value
+    
+    # Method to obtain the endpoints as two N x d NumPy arrays (left endpoints, right endpoints)
+    def getEndpointArrays( self ):
+        def compute():
+            left = np.array( self.list_left_endpts, dtype = float ).reshape( -1, self.dimension )
+            right = np.array( self.list_right_endpts, dtype = float ).reshape( -1, self.dimension )
+            return ( left, right )
+        return self._cached( 'endpointArrays', compute )
+    
+    # Method to obtain the projections of the approval sets on a circle axis, as a CircularSociety
+    def getAxisSociety( self, axis ):
+        if self.moduli[axis] is None:
+            raise ValueError( "Axis " + str(axis) + " is a line axis; only circle axes give circular societies" )
+        left, right = self.getEndpointArrays()
+        return generateSocietyFromEndpoints( self.name + " (axis " + str(axis) + ")", self.moduli[axis], left[:, axis], right[:, axis],
+                                             setNames = self.list_setnames, tick = self.tick )
+    
+    # Method to build the (number of points) x (number of sets) boolean containment matrix
+    #   points: (number of points) x d array;  entry [i, j] is True when the i-th point lies in the j-th approval set
+    def containmentMatrix( self, points ):
+        points = np.asarray( points, dtype = float ).reshape( -1, self.dimension )
+        left, right = self.getEndpointArrays()
+        isIn = np.ones( ( len(points), self.numVoters ), dtype = bool )
+        for k, modulo in enumerate( self.moduli ):
+            isIn &= _axisContains( points[:, k, None], left[None, :, k], right[None, :, k], modulo )
+        return isIn
+    
+    
+    ### FINDING, ADDING, REMOVING APPROVAL SETS-----------------------
+    
+    # Method to find an approval set by name
+    def findApprovalSetName( self, setName ):
+        return self._setIndex.get( setName, -1 ) # if set name not found, return -1
+    
+    # Method to add a new approval set into the society
+    #   left_endpt, right_endpt: one endpoint per axis
+    def addApprovalSet( self, setName, left_endpt, right_endpt ):
+        if self.findApprovalSetName( setName ) != -1:
+            print("Set is not added because this set name has already been chosen.  Please pick a different set name.")
+            return
+        self.addApprovalSets( [ setName ], [ left_endpt ], [ right_endpt ] )
+    
+    # Method to add many new approval sets into the society at once
+    #   setNames: list of names;  left_endpts, right_endpts: (number of sets) x d arrays of endpoints
+    #   The names are validated once for the whole batch; if any name is repeated or already chosen, no set is added
+    @_instrumented
+    def addApprovalSets( self, setNames, left_endpts, right_endpts ):
+        setNames = list( setNames )
+        left_endpts = np.asarray( left_endpts, dtype = float ).reshape( -1, self.dimension )
+        right_endpts = np.asarray( right_endpts, dtype = float ).reshape( -1, self.dimension )
+        if len( left_endpts ) != len( setNames ) or len( right_endpts ) != len( setNames ):
+            raise ValueError( "setNames, left_endpts and right_endpts must have the same length" )
+        for k, modulo in enumerate( self.moduli ):
+            if modulo is None and np.any( right_endpts[:, k] < left_endpts[:, k] ):
+                raise ValueError( "On the line axis " + str(k) + ", left endpoints cannot be larger than right endpoints" )
+        
+        if len( set( setNames ) ) < len( setNames ) or any( name in self._setIndex for name in setNames ):
+            print("Sets are not added because some set names are repeated or have already been chosen.  Please pick different set names.")
+            return
+        
+        self._setIndex.update( zip( setNames, range( self.numVoters, self.numVoters + len(setNames) ) ) )
+        self.numVoters += len( setNames )
+        self.list_setnames.extend( setNames )
+        self.list_left_endpts.extend( map( tuple, left_endpts.tolist() ) )
+        self.list_right_endpts.extend( map( tuple, right_endpts.tolist() ) )
+        self.version += 1
+    
+    # Method to remove an approval set from the society
+    def removeApprovalSet( self, setName ):
+        ind = self.findApprovalSetName( setName ) # if not found, ind = -1
+        if ind != -1:
+            self.list_setnames.pop(ind)
+            self.list_left_endpts.pop(ind)
+            self.list_right_endpts.pop(ind)
+            self.numVoters -= 1
+            self._setIndex = dict( zip( self.list_setnames, range( self.numVoters ) ) )
+            self.version += 1
+    
+    
+    ### AGREEMENT NUMBER, PIERCING NUMBER -----------------------
+    
+    # Method to find the agreement number (the largest number of approval sets with a common point)
+    # returns the agreement number, and a point (array of d coordinates) where it is attained (None if there are no sets)
+    @_instrumented
+    def findAgreementNumber( self ):
+        def compute():
+            left, right = self.getEndpointArrays()
+            return _productAgreement( left, right, self.moduli )
+        return self._cached( 'agreement', compute )
+    
+    # Method to find bounds on the piercing number (the smallest number of points that pierce every approval set)
+    #   lower bound: the largest piercing number of an axis (a piercing set projects to a piercing set of every axis),
+    #     and N / (agreement number), rounded up (a point pierces at most (agreement number) sets)
+    #   upper bound: the size of the piercing set found axis by axis (see _productPiercingSet), starting with each axis
+    #     in turn (from the one with the smallest piercing number), until the lower bound is reached
+    # returns the lower bound, the upper bound, and a piercing set of that size ((upper bound) x d array)
+    @_instrumented
+    def findPiercingBounds( self ):
+        N, d = self.numVoters, self.dimension
+        if N == 0:
+            return 0, 0, np.zeros( (0, d) )
+        left, right = self.getEndpointArrays()
+        axisNumbers = [ len( _axisPiercingSet( left[:, k], right[:, k], self.moduli[k] ) ) for k in range( d ) ]
+        agreement, _ = self.findAgreementNumber()
+        lowerBound = max( max( axisNumbers ), -( -N // agreement ) )
+        
+        piercingSet = None
+        for k in np.argsort( axisNumbers, kind = 'stable' ).tolist():
+            axes = [ k ] + [ i for i in range( d ) if i != k ]
+            points = _productPiercingSet( left[:, axes], right[:, axes], [ self.moduli[i] for i in axes ] )
+            if piercingSet is None or len( points ) < len( piercingSet ):
+                piercingSet = points[:, np.argsort( axes )]
+            if len( piercingSet ) == lowerBound:
+                break
+        return lowerBound, len( piercingSet ), piercingSet
+
+
+# Function to describe the set of one axis of an approval set
+def _axisSetString( left_endpt, right_endpt, modulo ):
+    if modulo is None or left_endpt < right_endpt:
+        return "[" + str(left_endpt) + ", " + str(right_endpt) + "]"
+    elif left_endpt == right_endpt:
+        return "[0, " + str(modulo) + "]"
+    return "([0, " + str(right_endpt) + "] U [" + str(left_endpt) + ", " + str(modulo) + "])"
+
+# Function to test whether points of one axis are in the sets of that axis (with NumPy broadcasting)
+def _axisContains( points, left_endpts, right_endpts, modulo ):
+    afterLeft = left_endpts <= points
+    beforeRight = points <= right_endpts
+    if modulo is None:
+        return afterLeft & beforeRight
+    return np.where( right_endpts <= left_endpts, afterLeft | beforeRight, afterLeft & beforeRight )
+
+# Function to describe the sets of one axis by ranges of positions in the sorted distinct endpoints of that axis
+#   left_endpts, right_endpts: (number of societies) x N arrays, one society per row (N >= 1)
+# returns coords (the sorted distinct endpoints of each society, one society after the other), rowBase (the position
+#   in coords of the first endpoint of each society), and two (number of societies) x N x 2 arrays starts, stops:
+#   the i-th set of a society contains coords[j] exactly when starts[., i, r] <= j < stops[., i, r] for r = 0 or 1
+#   (the second range is empty unless the set wraps around)
+def _axisRanges( left_endpts, right_endpts, modulo ):
+    starts, rightRanks, numDistinct, coords, rowBase = _rankEndpoints( left_endpts, right_endpts )
+    stops = rightRanks + 1
+    zeros = np.zeros_like( starts )
+    base = rowBase.reshape( -1, 1, 1 )
+    if modulo is None:
+        return coords, rowBase, np.stack( ( starts, zeros ), axis = 2 ) + base, np.stack( ( stops, zeros ), axis = 2 ) + base
+    
+    # On a circle axis: [start, M) and [0, stop) for sets that wrap around, [0, M) for sets that are the whole circle
+    wraps = right_endpts < left_endpts
+    isFull = right_endpts == left_endpts
+    firstStarts = np.where( isFull, 0, starts )
+    firstStops = np.where( wraps | isFull, numDistinct.reshape( -1, 1 ), stops )
+    secondStops = np.where( wraps, stops, 0 )
+    return coords, rowBase, np.stack( ( firstStarts, zeros ), axis = 2 ) + base, np.stack( ( firstStops, secondStops ), axis = 2 ) + base
+
+# Function to count the sets containing each of the M coordinates of an axis, from their ranges (see _axisRanges)
+def _rangeDepths( starts, stops, M ):
+    return np.cumsum( np.bincount( starts.ravel(), minlength = M + 1 ) - np.bincount( stops.ravel(), minlength = M + 1 ) )[:M]
+
+# Function to find the agreement number of a product society (the largest number of sets with a common point)
+#   left_endpts, right_endpts: N x d arrays of endpoints;  moduli: as in ProductSociety
+# returns the agreement number, and a point (array of d coordinates) where it is attained (None if N = 0)
+#
+# The sets are swept along axis 0, over its sorted endpoints: a set enters at the start of each of its ranges (see
+#   _axisRanges) and leaves at their end.  Every state of the sweep is a collection of sets containing a common
+#   coordinate of axis 0, and every such largest collection is a state, so the agreement number is the largest
+#   depth, over the states of the sweep and the points of the other axes, of the sets in the state.
+#   - d = 1: the depths along the axis are prefix sums.
+#   - d = 2: see _productAgreements2D.
+#   - d > 2: at each coordinate of axis 0 where a set starts, in order of decreasing depth along axis 0, the sets
+#     containing it are restricted to the other axes (recursively), until the depth along axis 0 is no larger than
+#     the best agreement number found.
+def _productAgreement( left_endpts, right_endpts, moduli ):
+    N, d = left_endpts.shape
+    if N == 0:
+        return 0, None
+    if d == 2:
+        agreements, locations = _productAgreements2D( left_endpts[None], right_endpts[None], moduli, findLocations = True )
+        return int( agreements[0] ), locations[0]
+    
+    coords, _, starts, stops = _axisRanges( left_endpts[None, :, 0], right_endpts[None, :, 0], moduli[0] )
+    starts, stops = starts[0], stops[0]
+    depths = _rangeDepths( starts, stops, len( coords ) )
+    if d == 1:
+        ind = np.argmax( depths )
+        return int( depths[ind] ), coords[ind:ind+1]
+    
+    candidates = np.unique( starts[ starts < stops ] )
+    candidates = candidates[ np.argsort( -depths[candidates], kind = 'stable' ) ]
+    agreement, location = 0, None
+    for j in candidates.tolist():
+        if depths[j] <= agreement:
+            break
+        inSets = np.any( ( starts <= j ) & ( j < stops ), axis = 1 )
+        depth, point = _productAgreement( left_endpts[inSets, 1:], right_endpts[inSets, 1:], moduli[1:] )
+        if depth > agreement:
+            agreement, location = depth, np.concatenate( ( coords[j:j+1], point ) )
+    return agreement, location
+
+# Function to find the agreement numbers of a batch of product societies with d = 2 (see _productAgreement)
+#   left_endpts, right_endpts: (number of societies) x N x 2 arrays (N >= 1)
+#   findLocations: if True, also finds a point where each agreement number is attained
+# returns the array of agreement numbers, and the (number of societies) x 2 array of points (None if not found)
+#
+# The depths along axis 1 are kept in an array, and the events of the sweep along axis 0 are processed in blocks of
+#   about sqrt(M) / 2 events (M endpoints on axis 1).  The ranges of the sets of a block cut axis 1 into at most
+#   4 * (block size) + 1 segments, on which the events of the block only add constants, so the largest depth of
+#   every state of the block is the largest (depth before the block) + (change since the start of the block) over
+#   the segments, computed for the whole block at once: O(N sqrt(N)) operations, in O(sqrt(N)) vectorized steps.
+#   The societies of a batch are laid side by side on both axes (as in _rankEndpoints), so they are swept together;
+#   axis 1 is also cut where each society starts, and the largest depth is kept separately for each society.
+def _productAgreements2D( left_endpts, right_endpts, moduli, findLocations = False ):
+    nSoc = len( left_endpts )
+    coords0, rowBase0, starts0, stops0 = _axisRanges( left_endpts[:, :, 0], right_endpts[:, :, 0], moduli[0] )
+    coords1, rowBase1, starts1, stops1 = _axisRanges( left_endpts[:, :, 1], right_endpts[:, :, 1], moduli[1] )
+    starts0, stops0 = starts0.reshape( -1, 2 ), stops0.reshape( -1, 2 )
+    starts1, stops1 = starts1.reshape( -1, 2 ), stops1.reshape( -1, 2 )
+    M1 = len( coords1 )
+    
+    # Events sorted by (position on axis 0, leaving before entering); sets still in at the end of their society's
+    #   axis 0 never leave
+    rowEnds0 = np.repeat( np.append( rowBase0[1:], len( coords0 ) ), left_endpts.shape[1] ).reshape( -1, 1 )
+    isRange = starts0 < stops0
+    leaves = isRange & ( stops0 < rowEnds0 )
+    enteringSets, leavingSets = np.nonzero( isRange )[0], np.nonzero( leaves )[0]
+    eventKeys = np.concatenate( ( 2 * starts0[isRange] + 1, 2 * stops0[leaves] ) )
+    order = np.argsort( eventKeys, kind = 'stable' )
+    eventKeys = eventKeys[order]
+    eventSets = np.concatenate( ( enteringSets, leavingSets ) )[order]
+    eventSigns = np.concatenate( ( np.ones( len(enteringSets), dtype = np.int64 ), -np.ones( len(leavingSets), dtype = np.int64 ) ) )[order]
+    eventStarts, eventStops = starts1[eventSets], stops1[eventSets]
+    
+    numEvents = len( eventKeys )
+    blockSize = max( 64, int( np.sqrt( M1 ) / 2 ) )
+    depths = np.zeros( M1, dtype = np.int64 )
+    agreements = np.zeros( nSoc, dtype = np.int64 )
+    locations = np.zeros( (nSoc, 2) ) if findLocations else None
+    for start in range( 0, numEvents, blockSize ):
+        stop = min( start + blockSize, numEvents )
+        blockStarts, blockStops = eventStarts[start:stop].ravel(), eventStops[start:stop].ravel()
+        cuts = np.unique( np.concatenate( ( rowBase1, blockStarts, blockStops ) ) )
+        cuts = cuts[ cuts < M1 ]
+        
+        # changes[i, s]: change of the depth on the s-th segment after the i-th event of the block
+        changes = np.zeros( ( stop - start, len(cuts) + 1 ), dtype = np.int64 )
+        rows = np.repeat( np.arange( stop - start ), 2 )
+        signs = np.repeat( eventSigns[start:stop], 2 )
+        np.add.at( changes, ( rows, np.searchsorted( cuts, blockStarts ) ), signs )
+        np.add.at( changes, ( rows, np.searchsorted( cuts, blockStops ) ), -signs )
+        changes = np.cumsum( np.cumsum( changes, axis = 1 )[:, :len(cuts)], axis = 0 )
+        
+        # largest depth of each segment (and the first event reaching it), then of each society
+        blockDepths = changes + np.maximum.reduceat( depths, cuts )
+        bestEvents = np.argmax( blockDepths, axis = 0 )
+        segmentDepths = blockDepths[ bestEvents, np.arange( len(cuts) ) ]
+        firstSegments = np.searchsorted( cuts, rowBase1 )
+        blockAgreements = np.maximum.reduceat( segmentDepths, firstSegments )
+        improved = np.flatnonzero( blockAgreements > agreements )
+        agreements[improved] = blockAgreements[improved]
+        
+        if findLocations:
+            for soc in improved.tolist():
+                lastSegment = firstSegments[soc+1] if soc + 1 < nSoc else len(cuts)
+                s = firstSegments[soc] + np.argmax( segmentDepths[ firstSegments[soc]:lastSegment ] )
+                segmentEnd = cuts[s+1] if s + 1 < len(cuts) else M1
+                locations[soc] = [ coords0[ eventKeys[ start + bestEvents[s] ] // 2 ], coords1[ cuts[s] + np.argmax( depths[ cuts[s]:segmentEnd ] ) ] ]
+        depths += np.repeat( changes[-1], np.diff( np.append( cuts, M1 ) ) )
+    return agreements, locations
+
+# Function to find a piercing set of the sets of one axis (exact)
+#   circle axis: the combinatorial algorithm of CircularSociety.findPiercingNumber (see _piercingSet)
+#   line axis: the greedy sweep in the order of the right endpoints
+# returns the sorted array of piercing points
+def _axisPiercingSet( left_endpts, right_endpts, modulo ):
+    if len( left_endpts ) == 0:
+        return np.array([])
+    if modulo is not None:
+        return _piercingSet( left_endpts, right_endpts )[1]
+    points = []
+    last = -np.inf
+    order = np.argsort( right_endpts, kind = 'stable' )
+    for left, right in zip( left_endpts[order].tolist(), right_endpts[order].tolist() ):
+        if left > last:
+            last = right
+            points.append( right )
+    return np.array( points )
+
+# Function to find a piercing set of a product society, axis by axis
+#   The sets are pierced along axis 0 (exactly, see _axisPiercingSet), and each set is assigned to the first piercing
+#   point x at or after its left endpoint on axis 0 (which is in the set).  The sets assigned to x are then pierced
+#   along the other axes (recursively), and each point y found gives the point (x, y).  The number of points is at
+#   most the product of the piercing numbers of the axes.
+# returns a (number of points) x d array
+def _productPiercingSet( left_endpts, right_endpts, moduli ):
+    N, d = left_endpts.shape
+    if N == 0:
+        return np.zeros( (0, d) )
+    points = _axisPiercingSet( left_endpts[:, 0], right_endpts[:, 0], moduli[0] )
+    if d == 1:
+        return points.reshape( -1, 1 )
+    
+    groups = np.searchsorted( points, left_endpts[:, 0] ) % len( points )
+    order = np.argsort( groups, kind = 'stable' )
+    bounds = np.searchsorted( groups[order], np.arange( len(points) + 1 ) )
+    piercingSet = []
+    for g in range( len(points) ):
+        members = order[ bounds[g]:bounds[g+1] ]
+        rest = _productPiercingSet( left_endpts[members, 1:], right_endpts[members, 1:], moduli[1:] )
+        piercingSet.append( np.column_stack( ( np.full( len(rest), points[g] ), rest ) ) )
+    return np.concatenate( piercingSet )
+
+# Function to draw the endpoints of random fixed-length approval sets (see generateRandomFixedLengthProductSociety)
+#   random: np.random or a numpy random Generator;  shape: shape of the arrays of sets
+# returns two arrays of shape shape + (d,), the left and right endpoints
+def _randomFixedLengthBoxes( random, shape, moduli, p ):
+    p = np.broadcast_to( np.asarray( p, dtype = float ), ( len(moduli), ) )
+    left = np.empty( shape + ( len(moduli), ) )
+    right = np.empty( shape + ( len(moduli), ) )
+    for k, modulo in enumerate( moduli ):
+        if modulo is None:
+            left[..., k] = random.uniform( low = 0, high = 1 - p[k], size = shape )
+            right[..., k] = left[..., k] + p[k]
+        else:
+            left[..., k] = random.uniform( low = 0, high = modulo, size = shape )
+            right[..., k] = ( left[..., k] + p[k] * modulo ) % modulo
+    return left, right
+
+# Define function to generate a random fixed-length product society
+#   N is number of voters
+#   moduli: one entry per axis, the modulo of a circle axis or None for a line axis
+#   p is a fraction between 0 and 1 (or a list of fractions, one per axis) that controls the length of approval sets
+#      On a circle axis, the length of each set is p times modulo (as in generateRandomFixedLengthSociety);
+#      a line axis is taken to be [0, 1], and the sets are intervals of length p in it
+@_instrumented
+def generateRandomFixedLengthProductSociety( societyname, N, moduli, p, tick = 0.5 ):
+    PS = ProductSociety( societyname, moduli, tick = tick )
+    left, right = _randomFixedLengthBoxes( np.random, ( N, ), moduli, p )
+    PS.addApprovalSets( [ "Set " + str(i+1) for i in range(N) ], left, right )
+    return PS
+
+# Define function to generate an ensemble of random fixed-length product societies
+#   (same distribution as generateRandomFixedLengthProductSociety)
+# returns two nSoc x N x d arrays of left and right endpoints (one society per row)
+def generateRandomFixedLengthProductEnsemble( nSoc, N, moduli, p, rng = None ):
+    rng = np.random.default_rng( rng )
+    return _randomFixedLengthBoxes( rng, ( nSoc, N ), moduli, p )
+
+# Function to compute the agreement number of every product society of an ensemble
+#   left_endpts, right_endpts: nSoc x N x d arrays of endpoints;  moduli: as in ProductSociety
+#   For d = 2, batches of societies are swept together (see _productAgreements2D); otherwise, each society is swept
+#   on its own (see _productAgreement), in a Python loop over the societies, so the batched speed-up only applies to
+#   d = 2 (e.g. about 0.3 ms per society for d = 2 and 7 ms for d = 3, with 20 sets).
+#   batchSize: number of societies swept at once (the memory used is O(batchSize * N))
+@_instrumented
+def productEnsembleAgreementNumbers( left_endpts, right_endpts, moduli, batchSize = 100 ):
+    left = np.asarray( left_endpts, dtype = float )
+    right = np.asarray( right_endpts, dtype = float )
+    nSoc, N, d = left.shape
+    agreementNumbers = np.zeros( nSoc, dtype = np.int64 )
+    if N == 0:
+        return agreementNumbers
+    if d != 2:
+        for i in range( nSoc ):
+            agreementNumbers[i] = _productAgreement( left[i], right[i], moduli )[0]
+        return agreementNumbers
+    
+    for start in range( 0, nSoc, batchSize ):
+        stop = min( start + batchSize, nSoc )
+        agreementNumbers[start:stop], _ = _productAgreements2D( left[start:stop], right[start:stop], moduli )
+    return agreementNumbers
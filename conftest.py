@@ -0,0 +1,2 @@
+# Lets the tests import circularsocieties from the repository root (pytest adds the directory of this file to
+#   sys.path)
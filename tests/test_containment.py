@@ -0,0 +1,60 @@
+# Regression checks for containment detection (checkContainmentAll), against the containment matrix of pointsInSets
+import itertools
+
+import numpy as np
+
+import circularsocieties as cs
+
+
+# Function to find the pairs [contained, container] from the points of the sets: all the endpoints, and a point
+#   between every two consecutive endpoints (including the arc through 0)
+def bruteForcePairs( CS ):
+    left, right, _ = CS.getEndpointArrays()
+    coords = np.unique( np.concatenate( (left, right) ) )
+    gaps = ( coords + np.roll( coords, -1 ) + CS.modulo * ( np.arange( len(coords) ) == len(coords) - 1 ) ) / 2 % CS.modulo
+    isIn = cs.pointsInSets( np.concatenate( (coords, gaps) ), left, right )
+    pairs = set()
+    for i, j in itertools.permutations( range( CS.numVoters ), 2 ):
+        if np.all( isIn[:, j] >= isIn[:, i] ):
+            pairs.add( frozenset( (i, j) ) if np.array_equal( isIn[:, i], isIn[:, j] ) else (i, j) )
+    return pairs
+
+def foundPairs( CS ):
+    pairs = set()
+    for contained, container in CS.checkContainmentAll( findContainmentPairs = True )[1]:
+        i, j = CS.findApprovalSetName( contained ), CS.findApprovalSetName( container )
+        left, right, _ = CS.getEndpointArrays()
+        isIdentical = ( left[i] == left[j] and right[i] == right[j] ) or ( left[i] == right[i] and left[j] == right[j] )
+        pairs.add( frozenset( (i, j) ) if isIdentical else (i, j) )
+    return pairs
+
+def test_fullCircleSets():
+    CS = cs.generateSocietyFromTuples( 'full', 10, [ ('f1', 5, 5), ('f2', 2, 2), ('w', 8, 3), ('a', 4, 6) ] )
+    isFound, pairs = CS.checkContainmentAll( findContainmentPairs = True )
+    assert isFound
+    assert sorted( pairs ) == sorted( [ ['w', 'f1'], ['a', 'f1'], ['w', 'f2'], ['a', 'f2'], ['f2', 'f1'] ] )
+    
+    CS = cs.generateSocietyFromTuples( 'full', 10, [ ('full', 5, 5), ('A', 3, 7) ] )
+    assert CS.checkContainmentAll()
+    assert CS.checkContainmentAll( findContainmentPairs = True ) == ( True, [ ['A', 'full'] ] )
+    assert CS.checkContainmentPair( ['A', 'full'] )
+
+def test_randomSocieties():
+    rng = np.random.default_rng( 0 )
+    for trial in range( 300 ):
+        N = int( rng.integers( 1, 8 ) )
+        CS = cs.generateSocietyFromEndpoints( 'random', 6, rng.integers( 0, 6, N ), rng.integers( 0, 6, N ) )
+        expected = bruteForcePairs( CS )
+        assert foundPairs( CS ) == expected
+        assert CS.checkContainmentAll() == ( len( expected ) > 0 )
+        for i, j in itertools.combinations( range( N ), 2 ):
+            isContained = (i, j) in expected or (j, i) in expected or frozenset( (i, j) ) in expected
+            assert CS.checkContainmentPair( [ CS.list_setnames[i], CS.list_setnames[j] ] ) == isContained
+
+def test_uniformizeSharedEndpoints():
+    # eliminating containment first leaves containment here; the original implementation reached this society
+    CS = cs.generateSocietyFromEndpoints( 'shared', 12, [10, 9, 0], [5, 6, 5] )
+    CS.uniformize()
+    assert sorted( zip( CS.list_left_endpts, CS.list_right_endpts ) ) == [ (0, 6), (5, 10), (9, 5) ]
+    assert not CS.checkContainmentAll()
+    assert CS.is_LR_alt()
@@ -0,0 +1,46 @@
+# Checks of DynamicCircularSociety (agreement number kept in a treap) and of the cyclic order of endpoints kept
+#   between changes, against computations from scratch after random changes
+import numpy as np
+
+import circularsocieties as cs
+
+
+def test_randomChanges():
+    rng = np.random.default_rng( 0 )
+    DCS = cs.DynamicCircularSociety( 'dynamic', 10 )
+    numAdded = 0
+    for step in range( 600 ):
+        action = rng.integers( 3 ) if DCS.numVoters > 0 else 0
+        # integer endpoints, so that sets share endpoints and some cover the whole circle
+        left, right = int( rng.integers( 0, 10 ) ), int( rng.integers( 0, 10 ) )
+        if action == 0:
+            DCS.addApprovalSet( 'Set ' + str(numAdded), left, right )
+            numAdded += 1
+        elif action == 1:
+            DCS.removeApprovalSet( DCS.list_setnames[ rng.integers( DCS.numVoters ) ] )
+        else:
+            DCS.editApprovalSet( DCS.list_setnames[ rng.integers( DCS.numVoters ) ], left, right )
+        
+        CS = cs.generateSocietyFromEndpoints( 'static', 10, DCS.list_left_endpts, DCS.list_right_endpts )
+        agreement, location = DCS.findAgreementNumber()
+        assert agreement == CS.findAgreementNumber()[0]
+        if DCS.numVoters > 0:
+            assert DCS.depthAt( location ) == agreement
+
+def test_endpointOrderAfterEdits():
+    rng = np.random.default_rng( 1 )
+    CS = cs.generateSocietyFromEndpoints( 'random', 1, rng.random( 50 ), rng.random( 50 ) )
+    CS.getEndpointOrder()
+    for step in range( 500 ):
+        CS.editApprovalSet( CS.list_setnames[ rng.integers( 50 ) ], rng.random(), rng.random() )
+        assert len( CS._pendingOrderChanges ) <= 32
+        if step % 7 == 0:
+            setIndices, isRight, endpts = CS.getEndpointOrder()
+            left, right, _ = CS.getEndpointArrays()
+            allEndpts = np.concatenate( (left, right) )
+            allIsLeft = np.repeat( [1, 0], 50 )
+            allIndices = np.tile( np.arange( 50 ), 2 )
+            order = np.lexsort( (allIndices, allIsLeft, allEndpts) )
+            assert np.array_equal( setIndices, allIndices[order] )
+            assert np.array_equal( isRight, allIsLeft[order] == 0 )
+            assert np.array_equal( endpts, allEndpts[order] )
@@ -0,0 +1,35 @@
+# Checks of the stopping rule of estimatePiercingProbabilities
+import numpy as np
+
+import circularsocieties as cs
+
+
+# Function to check that every sampled probability meets relError and every unsampled one is below zeroBound
+def checkRelError( probs, lower, upper, relError, zeroBound ):
+    isSampled = probs > 0
+    halfWidth = ( upper - lower ) / 2
+    assert np.all( halfWidth[isSampled] <= relError * probs[isSampled] * ( 1 + 1e-12 ) )
+    assert np.all( upper[~isSampled] <= zeroBound )
+
+
+def test_relErrorGovernsRareProbabilities( ):
+    relError, zeroBound = 0.5, 1e-3
+    probs, lower, upper, nSamples, converged = cs.estimatePiercingProbabilities( 20, 0.1, 6, relError = relError,
+                                                                                zeroBound = zeroBound, rng = 0 )
+    assert converged
+    assert probs[3] > 0
+    checkRelError( probs, lower, upper, relError, zeroBound )
+
+def test_impossibleTauConverges( ):
+    # with 4 sets, piercing numbers 5 and 6 are impossible and never sampled
+    probs, lower, upper, nSamples, converged = cs.estimatePiercingProbabilities( 4, 0.3, 6, relError = 0.2,
+                                                                                zeroBound = 1e-3, rng = 1 )
+    assert converged
+    assert np.all( probs[4:] == 0 )
+    checkRelError( probs, lower, upper, 0.2, 1e-3 )
+
+def test_ciWidthDefault( ):
+    probs, lower, upper, nSamples, converged = cs.estimatePiercingProbabilities( 6, 0.19, 6, rng = 2 )
+    assert converged
+    assert np.all( upper - lower <= 0.01 )
+    assert np.isclose( probs.sum( ), 1 )
@@ -0,0 +1,85 @@
+# Checks of the piercing number: the ILP solvers and the result cache, against a brute-force search
+import itertools
+
+import numpy as np
+import pytest
+
+import circularsocieties as cs
+
+
+def isPiercingSet( CS, points ):
+    left, right, _ = CS.getEndpointArrays()
+    return bool( np.all( cs.pointsInSets( points, left, right ).any( axis = 0 ) ) )
+
+# Function to find the piercing number by trying every collection of right endpoints (a set can always be pierced
+#   at the right endpoint of a set it contains, so these points are enough)
+def bruteForcePiercingNumber( CS ):
+    _, right, _ = CS.getEndpointArrays()
+    candidates = np.unique( right )
+    for k in range( 1, len( candidates ) + 1 ):
+        for points in itertools.combinations( candidates, k ):
+            if isPiercingSet( CS, np.array( points ) ):
+                return k
+    return 0
+
+def randomSocieties( numSocieties, seed ):
+    rng = np.random.default_rng( seed )
+    for trial in range( numSocieties ):
+        N = int( rng.integers( 1, 8 ) )
+        yield cs.generateSocietyFromEndpoints( 'random', 8, rng.integers( 0, 8, N ), rng.integers( 0, 8, N ) )
+
+
+def test_combinatorial():
+    for CS in randomSocieties( 200, 0 ):
+        piercingNumber, piercingSet, _, _ = CS.findPiercingNumber()
+        assert piercingNumber == bruteForcePiercingNumber( CS )
+        assert len( piercingSet ) == piercingNumber and isPiercingSet( CS, piercingSet )
+
+@pytest.mark.parametrize( 'solver', [ 'HIGHS', 'GLPK_MI' ] )
+def test_ILP( solver ):
+    pytest.importorskip( 'scipy' )
+    if solver == 'GLPK_MI':
+        cp = pytest.importorskip( 'cvxpy' )
+        if 'GLPK_MI' not in cp.installed_solvers():
+            pytest.skip( "GLPK_MI is not installed" )
+    for CS in randomSocieties( 50, 1 ):
+        piercingNumber, piercingSet, _, _ = CS.findPiercingNumber( method = 'ILP', solver = solver )
+        assert piercingNumber == bruteForcePiercingNumber( CS )
+        assert len( piercingSet ) == piercingNumber and isPiercingSet( CS, piercingSet )
+
+def test_ILPNoSolution( monkeypatch ):
+    optimize = pytest.importorskip( 'scipy.optimize' )
+    class Result:
+        x, status, message = None, 2, "infeasible"
+    monkeypatch.setattr( optimize, 'milp', lambda *args, **kwargs: Result() )
+    CS = cs.generateSocietyFromEndpoints( 'small', 10, [1, 4], [3, 6] )
+    with pytest.raises( RuntimeError, match = "HiGHS" ):
+        CS.findPiercingNumber( method = 'ILP' )
+
+def test_ILPNoSolutionGLPK( monkeypatch ):
+    cp = pytest.importorskip( 'cvxpy' )
+    pytest.importorskip( 'scipy' )
+    monkeypatch.setattr( cp.Problem, 'solve', lambda self, *args, **kwargs: None )
+    CS = cs.generateSocietyFromEndpoints( 'small', 10, [1, 4], [3, 6] )
+    with pytest.raises( RuntimeError, match = "GLPK_MI" ):
+        CS.findPiercingNumber( method = 'ILP', solver = 'GLPK_MI' )
+
+def test_cachedPiercingSet():
+    rng = np.random.default_rng( 2 )
+    cs.enableResultCache()
+    try:
+        for trial in range( 50 ):
+            N = int( rng.integers( 1, 8 ) )
+            left, right = rng.integers( 0, 8, N ), rng.integers( 0, 8, N )
+            first = cs.generateSocietyFromEndpoints( 'first', 8, left, right )
+            # the same type: endpoints moved by an increasing map, then rotated
+            moved = cs.generateSocietyFromEndpoints( 'moved', 8, ( left**1.5 / 8**0.5 + 3 ) % 8, ( right**1.5 / 8**0.5 + 3 ) % 8 )
+            assert first.getCanonicalForm()[0] == moved.getCanonicalForm()[0]
+            first.findPiercingNumber()
+            hits = cs.resultCacheInfo()['hits']
+            piercingNumber, piercingSet, _, _ = moved.findPiercingNumber()
+            assert cs.resultCacheInfo()['hits'] == hits + 1
+            assert piercingNumber == bruteForcePiercingNumber( moved )
+            assert len( piercingSet ) == piercingNumber and isPiercingSet( moved, piercingSet )
+    finally:
+        cs.disableResultCache()
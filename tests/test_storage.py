@@ -0,0 +1,28 @@
+# Checks that societies and ensembles are read back as they were saved (Part 6)
+import numpy as np
+
+import circularsocieties as cs
+
+
+def test_societyRoundTrip( tmp_path ):
+    CS = cs.generateSocietyFromTuples( 'saved', 10, [ ('a', 1, 4), ('wrap', 8, 2), ('full', 5, 5), ('é', 3.25, 7.5) ] )
+    filename = str( tmp_path / 'society.bin' )
+    CS.save( filename, includeResults = True )
+    loaded, results = cs.loadSociety( filename, loadResults = True )
+    assert loaded.name == CS.name and loaded.modulo == CS.modulo and loaded.tick == CS.tick
+    assert loaded.list_setnames == CS.list_setnames
+    assert loaded.list_left_endpts == CS.list_left_endpts
+    assert loaded.list_right_endpts == CS.list_right_endpts
+    assert results['agreementNumber'] == CS.findAgreementNumber()[0]
+    assert results['piercingNumber'] == CS.findPiercingNumber()[0]
+
+def test_ensembleRoundTrip( tmp_path ):
+    left, right = cs.generateRandomFixedLengthEnsemble( 20, 6, 1, 0.3, rng = 0 )
+    piercingNumbers = cs.ensemblePiercingNumbers( left, right )
+    filename = str( tmp_path / 'ensemble.bin' )
+    cs.saveEnsemble( filename, left, right, 1, results = { 'piercingNumbers': piercingNumbers } )
+    for mmap in [ True, False ]:
+        loadedLeft, loadedRight, modulo, results = cs.loadEnsemble( filename, mmap = mmap )
+        assert modulo == 1
+        assert np.array_equal( loadedLeft, left ) and np.array_equal( loadedRight, right )
+        assert np.array_equal( results['piercingNumbers'], piercingNumbers )